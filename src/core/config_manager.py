@@ -10,13 +10,112 @@
 
 import os
 import re
+import copy
+import json
+import inspect
 import yaml
 import logging
-from typing import Any, Dict, Optional
+import weakref
+from collections import namedtuple
+from typing import Any, Callable, Dict, List, Optional, Tuple
 from pathlib import Path
+from threading import Lock
+from types import SimpleNamespace
+
+# 优先使用 libyaml 提供的 C 解析器，不可用时回退到纯 Python 实现
+try:
+    from yaml import CSafeLoader as _Loader, CSafeDumper as _Dumper
+except ImportError:
+    from yaml import SafeLoader as _Loader, SafeDumper as _Dumper
+
+# orjson 为可选依赖，用于加速 JSON 缓存文件的读写，不可用时回退到标准库 json
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 logger = logging.getLogger(__name__)
 
+# 已解析配置缓存: 绝对路径 -> (st_mtime_ns, st_size, 解析结果)
+_YAML_CACHE: Dict[str, Tuple[int, int, Dict]] = {}
+
+# 点号路径拆分缓存: 'a.b.c' -> ('a', 'b', 'c')
+_split_cache: Dict[str, Tuple[str, ...]] = {}
+
+
+def _split_path(path: str) -> Tuple[str, ...]:
+    """拆分点号分隔的配置路径，结果按路径字符串缓存"""
+    keys = _split_cache.get(path)
+    if keys is None:
+        keys = _split_cache[path] = tuple(path.split('.'))
+    return keys
+
+
+# 预编译的配置项验证规则，缺省的约束为 None
+RuleSpec = namedtuple('RuleSpec', ['path', 'type', 'required', 'min', 'max', 'enum'])
+
+
+class ConfigSection(SimpleNamespace):
+    """配置节点的属性访问镜像，缺失的配置项返回 None，与 get() 的默认行为一致"""
+    
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return None
+
+
+def _to_section(node: Dict) -> ConfigSection:
+    """将嵌套配置字典转换为 ConfigSection
+    
+    Args:
+        node: 配置字典
+        
+    Returns:
+        ConfigSection: 配置镜像，子字典同样转换为 ConfigSection
+    """
+    return ConfigSection(**{
+        str(key): _to_section(value) if isinstance(value, dict) else value
+        for key, value in node.items()
+    })
+
+
+def _compile_rules(rules: Dict[str, Dict]) -> Tuple[RuleSpec, ...]:
+    """将验证规则字典展开为 RuleSpec 列表
+    
+    Args:
+        rules: 配置路径 -> 验证规则
+        
+    Returns:
+        Tuple[RuleSpec, ...]: 验证规则列表
+    """
+    return tuple(
+        RuleSpec(path=path,
+                 type=rule['type'],
+                 required=rule.get('required', False),
+                 min=rule.get('min'),
+                 max=rule.get('max'),
+                 enum=tuple(rule['enum']) if 'enum' in rule else None)
+        for path, rule in rules.items()
+    )
+
+
+def _compile_env_mapping(env_mapping: Dict[str, str],
+                         rules: Dict[str, Dict]) -> Tuple[Tuple[str, str, Tuple[str, ...], Optional[type]], ...]:
+    """预先拆分环境变量映射的配置路径并确定目标类型
+    
+    Args:
+        env_mapping: 环境变量名 -> 配置路径
+        rules: 配置项验证规则
+        
+    Returns:
+        Tuple: (环境变量名, 配置路径, 拆分后的路径, 目标类型) 列表
+    """
+    return tuple(
+        (env_var, path, _split_path(path), rules.get(path, {}).get('type'))
+        for env_var, path in env_mapping.items()
+    )
+
+
 class ConfigManager:
     """配置管理器"""
     
@@ -31,6 +130,8 @@ class ConfigManager:
         'local_monitor.polling_interval': {'type': int, 'min': 30, 'max': 3600},
         'local_monitor.watch_patterns': {'type': list},
         'local_monitor.ignore_patterns': {'type': list},
+        'local_monitor.polling_mode': {'type': str, 'enum': ['off', 'fallback', 'always']},
+        'local_monitor.compare_contents': {'type': bool},
         'symlink.target_base': {'type': str},
         'symlink.video_extensions': {'type': list},
         'emby.server_url': {'type': str},
@@ -41,7 +142,8 @@ class ConfigManager:
         'logging.level': {'type': str, 'enum': ['DEBUG', 'INFO', 'WARNING', 'ERROR']},
         'logging.max_size': {'type': int, 'min': 1048576},  # 最小1MB
         'health_check.interval': {'type': int, 'min': 60, 'max': 3600},
-        'task_queue.max_workers': {'type': int, 'min': 1, 'max': 16}
+        'task_queue.max_workers': {'type': int, 'min': 1, 'max': 16},
+        'task_queue.max_pending': {'type': int, 'min': 1}
     }
     
     # 环境变量映射
@@ -51,6 +153,7 @@ class ConfigManager:
         'GOOGLE_DRIVE_POLL_INTERVAL': 'google_drive.api_call_interval',
         'MOUNT_POINT': 'local_monitor.mount_point',
         'LOCAL_POLL_INTERVAL': 'local_monitor.polling_interval',
+        'LOCAL_POLL_MODE': 'local_monitor.polling_mode',
         'SYMLINK_TARGET': 'symlink.target_base',
         'EMBY_SERVER_URL': 'emby.server_url',
         'EMBY_API_KEY': 'emby.api_key',
@@ -58,6 +161,12 @@ class ConfigManager:
         'DB_PATH': 'database.path'
     }
     
+    # 预编译的验证规则，避免每次验证时逐项查找规则字典
+    _RULES = _compile_rules(VALIDATION_RULES)
+    
+    # 预编译的环境变量映射，避免每次加载重复拆分路径和查找验证规则
+    _ENV_MAPPING_COMPILED = _compile_env_mapping(ENV_MAPPING, VALIDATION_RULES)
+    
     def __init__(self, config_path: Optional[str] = None):
         """初始化配置管理器
         
@@ -66,11 +175,18 @@ class ConfigManager:
         """
         self.config_path = config_path or os.getenv('CONFIG_PATH', 'config/config.yaml')
         self.config: Dict[str, Any] = {}
+        self._file_config: Dict[str, Any] = {}  # 配置文件中的值，不含环境变量覆盖，保存时只写入这部分
+        self._flat: Dict[str, Any] = {}  # 叶子配置项的扁平镜像: 点号路径 -> 值
+        self.c = ConfigSection()  # 配置的属性访问镜像，如 c.database.path
+        self._subscribers: Dict[str, List[Callable[[], Optional[Callable]]]] = {}
+        self._subscribers_lock = Lock()
         self.load_config()
     
     def load_config(self):
         """加载配置文件"""
         try:
+            old_values = self._subscribed_values()
+            
             # 确保配置目录存在
             os.makedirs(os.path.dirname(self.config_path), exist_ok=True)
             
@@ -78,15 +194,33 @@ class ConfigManager:
             if not os.path.exists(self.config_path):
                 self.create_default_config()
             
-            # 读取配置文件
-            with open(self.config_path, 'r', encoding='utf-8') as f:
-                self.config = yaml.safe_load(f)
+            # 文件未变化时直接使用缓存的解析结果
+            cache_key = os.path.abspath(self.config_path)
+            st = os.stat(self.config_path)
+            cached = _YAML_CACHE.get(cache_key)
+            if cached and cached[:2] == (st.st_mtime_ns, st.st_size):
+                self.config = copy.deepcopy(cached[2])
+            else:
+                sidecar = self._load_json_sidecar(st)
+                if sidecar is not None:
+                    self.config = sidecar
+                else:
+                    # 读取配置文件
+                    with open(self.config_path, 'r', encoding='utf-8') as f:
+                        self.config = yaml.load(f, Loader=_Loader)
+                    self._write_json_sidecar(st)
+                _YAML_CACHE[cache_key] = (st.st_mtime_ns, st.st_size,
+                                          copy.deepcopy(self.config))
+            self._file_config = copy.deepcopy(self.config)
+            self._flat = self._flatten(self.config)
             
             # 使用环境变量覆盖配置
             self._override_from_env()
             
             # 验证配置
             self._validate_config()
+            self.c = _to_section(self.config)
+            self._notify_subscribers(old_values)
             
             logger.info("配置加载完成")
             
@@ -94,11 +228,58 @@ class ConfigManager:
             logger.error(f"加载配置失败: {e}")
             raise
     
+    @property
+    def _sidecar_path(self) -> str:
+        """JSON 缓存文件路径"""
+        return self.config_path + '.json'
+    
+    def _load_json_sidecar(self, st: os.stat_result) -> Optional[Dict]:
+        """读取 JSON 缓存文件
+        
+        Args:
+            st: 配置文件的 stat 结果
+            
+        Returns:
+            Optional[Dict]: 缓存文件不存在或与配置文件不一致时返回 None
+        """
+        try:
+            with open(self._sidecar_path, 'rb') as f:
+                data = f.read()
+            sidecar = orjson.loads(data) if orjson else json.loads(data)
+            # 以源文件的修改时间和大小判断缓存是否有效，避免时间精度不足导致误判
+            if sidecar.get('source') != [st.st_mtime_ns, st.st_size]:
+                return None
+            return sidecar['config']
+        except (OSError, ValueError, KeyError, AttributeError):
+            return None
+    
+    def _write_json_sidecar(self, st: os.stat_result):
+        """将解析结果写入 JSON 缓存文件，加快下次启动
+        
+        Args:
+            st: 配置文件的 stat 结果
+        """
+        try:
+            sidecar = {'source': [st.st_mtime_ns, st.st_size], 'config': self.config}
+            if orjson:
+                data = orjson.dumps(sidecar)
+            else:
+                data = json.dumps(sidecar, ensure_ascii=False).encode('utf-8')
+            with open(self._sidecar_path, 'wb') as f:
+                f.write(data)
+        except (OSError, TypeError, ValueError) as e:
+            # 配置目录只读或包含无法序列化的值时不影响正常加载
+            logger.debug(f"写入配置缓存失败: {e}")
+            try:
+                os.remove(self._sidecar_path)
+            except OSError:
+                pass
+    
     def create_default_config(self):
         """创建默认配置文件"""
         try:
             with open(self.config_path, 'w', encoding='utf-8') as f:
-                yaml.safe_dump(self._get_default_config(), f, allow_unicode=True)
+                yaml.dump(self._get_default_config(), f, Dumper=_Dumper, allow_unicode=True)
             logger.info(f"创建默认配置文件: {self.config_path}")
         except Exception as e:
             logger.error(f"创建默认配置文件失败: {e}")
@@ -122,7 +303,9 @@ class ConfigManager:
                 'mount_point': '/media/mount',
                 'polling_interval': 300,
                 'watch_patterns': ['*'],
-                'ignore_patterns': ['.git/*', '*.tmp']
+                'ignore_patterns': ['.git/*', '*.tmp'],
+                'polling_mode': 'always',
+                'compare_contents': False
             },
             'symlink': {
                 'target_base': '/media/links',
@@ -168,18 +351,27 @@ class ConfigManager:
                 'max_workers': 4,
                 'max_retries': 3,
                 'retry_delay': 5,
-                'batch_size': 100
+                'batch_size': 100,
+                'max_pending': 10000
             }
         }
     
     def _override_from_env(self):
         """使用环境变量覆盖配置"""
-        for env_var, config_path in self.ENV_MAPPING.items():
+        for env_var, path, keys, value_type in self._ENV_MAPPING_COMPILED:
             value = os.getenv(env_var)
-            if value is not None:
-                self.set(config_path, self._convert_value(value, config_path))
+            if value is None:
+                continue
+            
+            # 直接写入嵌套字典，环境变量映射的都是叶子配置项
+            current = self.config
+            for key in keys[:-1]:
+                current = current.setdefault(key, {})
+            value = self._convert_type(value, value_type)
+            current[keys[-1]] = value
+            self._flat[path] = value
     
-    def _convert_value(self, value: str, config_path: str) -> Any:
+    def convert_value(self, value: str, config_path: str) -> Any:
         """转换配置值类型
         
         Args:
@@ -189,47 +381,91 @@ class ConfigManager:
         Returns:
             Any: 转换后的配置值
         """
-        if config_path not in self.VALIDATION_RULES:
-            return value
+        if config_path in self.VALIDATION_RULES:
+            return self._convert_type(value, self.VALIDATION_RULES[config_path]['type'])
+        
+        # 没有校验规则时按当前值的类型转换
+        current = self.get(config_path)
+        if isinstance(current, (bool, int, float)):
+            return self._convert_type(value, type(current))
+        return value
+    
+    @staticmethod
+    def _convert_type(value: str, value_type: Optional[type]) -> Any:
+        """按目标类型转换字符串配置值
+        
+        Args:
+            value: 配置值
+            value_type: 目标类型，None 表示保持字符串
             
-        rule = self.VALIDATION_RULES[config_path]
-        if rule['type'] == bool:
+        Returns:
+            Any: 转换后的配置值
+        """
+        if value_type == bool:
             return value.lower() in ('true', '1', 'yes', 'on')
-        elif rule['type'] == int:
+        elif value_type == int:
             return int(value)
-        elif rule['type'] == float:
+        elif value_type == float:
             return float(value)
-        elif rule['type'] == list:
+        elif value_type == list:
             return value.split(',')
         return value
     
-    def _validate_config(self):
-        """验证配置项"""
-        for path, rule in self.VALIDATION_RULES.items():
-            value = self.get(path)
+    def _validate_config(self, flat: Optional[Dict[str, Any]] = None):
+        """验证配置项
+        
+        Args:
+            flat: 待验证的扁平配置，默认为当前配置
+        """
+        if flat is None:
+            flat = self._flat
+        for rule in self._RULES:
+            path = rule.path
+            value = flat.get(path)
             
             # 检查必需项
-            if rule.get('required', False) and not value:
-                raise ValueError(f"配置项 {path} 为必填项")
-            
-            # 如果值为空且非必需，跳过后续验证
-            if not value and not rule.get('required', False):
+            if not value:
+                if rule.required:
+                    raise ValueError(f"配置项 {path} 为必填项")
+                # 值为空且非必需，跳过后续验证
                 continue
             
             # 类型检查
-            if not isinstance(value, rule['type']):
-                raise TypeError(f"配置项 {path} 类型必须为 {rule['type'].__name__}")
+            if not isinstance(value, rule.type):
+                raise TypeError(f"配置项 {path} 类型必须为 {rule.type.__name__}")
             
             # 数值范围检查
             if isinstance(value, (int, float)):
-                if 'min' in rule and value < rule['min']:
-                    raise ValueError(f"配置项 {path} 不能小于 {rule['min']}")
-                if 'max' in rule and value > rule['max']:
-                    raise ValueError(f"配置项 {path} 不能大于 {rule['max']}")
+                if rule.min is not None and value < rule.min:
+                    raise ValueError(f"配置项 {path} 不能小于 {rule.min}")
+                if rule.max is not None and value > rule.max:
+                    raise ValueError(f"配置项 {path} 不能大于 {rule.max}")
             
             # 枚举值检查
-            if 'enum' in rule and value not in rule['enum']:
-                raise ValueError(f"配置项 {path} 必须是以下值之一: {', '.join(rule['enum'])}")
+            if rule.enum is not None and value not in rule.enum:
+                raise ValueError(f"配置项 {path} 必须是以下值之一: {', '.join(rule.enum)}")
+    
+    @staticmethod
+    def _flatten(node: Any, prefix: str = '') -> Dict[str, Any]:
+        """将嵌套配置展开为 点号路径 -> 叶子值 的字典
+        
+        Args:
+            node: 配置节点
+            prefix: 当前节点路径
+            
+        Returns:
+            Dict[str, Any]: 扁平化后的配置
+        """
+        flat = {}
+        if not isinstance(node, dict):
+            return flat
+        for key, value in node.items():
+            path = f"{prefix}.{key}" if prefix else str(key)
+            if isinstance(value, dict):
+                flat.update(ConfigManager._flatten(value, path))
+            else:
+                flat[path] = value
+        return flat
     
     def get(self, path: str, default: Any = None) -> Any:
         """获取配置项
@@ -241,9 +477,15 @@ class ConfigManager:
         Returns:
             Any: 配置值
         """
+        try:
+            return self._flat[path]
+        except KeyError:
+            pass
+        
+        # 非叶子节点回退到逐级查找
         try:
             value = self.config
-            for key in path.split('.'):
+            for key in _split_path(path):
                 value = value[key]
             return value
         except (KeyError, TypeError):
@@ -256,23 +498,147 @@ class ConfigManager:
             path: 配置路径，使用点号分隔，如 'google_drive.folder_id'
             value: 配置值
         """
-        keys = path.split('.')
-        current = self.config
+        self.update({path: value})
+    
+    def update(self, values: Dict[str, Any]):
+        """批量设置配置项
+        
+        先在副本上验证合并后的配置，验证失败时抛出异常且不修改当前配置；
+        所有配置项写入后只重建一次属性访问视图、通知一次订阅者。
+        
+        Args:
+            values: 配置路径 -> 配置值
+            
+        Raises:
+            ValueError, TypeError: 配置项验证失败
+        """
+        flat = dict(self._flat)
+        for path, value in values.items():
+            self._assign_flat(flat, path, value)
+        self._validate_config(flat)
+        
+        old_values = self._subscribed_values()
+        for path, value in values.items():
+            keys = _split_path(path)
+            self._assign_tree(self.config, keys, value)
+            self._assign_tree(self._file_config, keys, copy.deepcopy(value))
+        self._flat = flat
+        self.c = _to_section(self.config)
+        self._notify_subscribers(old_values)
+    
+    @staticmethod
+    def _assign_tree(tree: Dict, keys: Tuple[str, ...], value: Any):
+        """写入嵌套配置字典
+        
+        Args:
+            tree: 嵌套配置字典
+            keys: 拆分后的配置路径
+            value: 配置值
+        """
+        current = tree
         
         # 遍历到最后一个键之前
         for key in keys[:-1]:
-            if key not in current:
+            if not isinstance(current.get(key), dict):
                 current[key] = {}
             current = current[key]
         
         # 设置最后一个键的值
         current[keys[-1]] = value
     
+    @classmethod
+    def _assign_flat(cls, flat: Dict[str, Any], path: str, value: Any):
+        """写入扁平配置镜像
+        
+        Args:
+            flat: 扁平配置
+            path: 配置路径，使用点号分隔
+            value: 配置值
+        """
+        keys = _split_path(path)
+        
+        # 移除祖先和子孙路径上的旧值
+        for i in range(1, len(keys)):
+            flat.pop('.'.join(keys[:i]), None)
+        prefix = path + '.'
+        for stale in [k for k in flat if k.startswith(prefix)]:
+            del flat[stale]
+        if isinstance(value, dict):
+            flat.update(cls._flatten(value, path))
+        else:
+            flat[path] = value
+    
+    def subscribe(self, path: str, callback: Callable[[Any], None]):
+        """订阅配置项变化
+        
+        配置通过 set、update 或 reload 改变后以新值调用回调。绑定方法以弱引用保存，
+        订阅不会延长所属对象的生命周期，对象回收后订阅自动失效。
+        
+        Args:
+            path: 配置路径，使用点号分隔
+            callback: 回调函数，参数为新的配置值
+        """
+        if inspect.ismethod(callback):
+            ref = weakref.WeakMethod(callback)
+        else:
+            ref = lambda: callback
+        with self._subscribers_lock:
+            self._subscribers.setdefault(path, []).append(ref)
+    
+    def _subscribed_values(self) -> Dict[str, Any]:
+        """获取已订阅配置项的当前值
+        
+        Returns:
+            Dict[str, Any]: 配置路径 -> 当前值
+        """
+        with self._subscribers_lock:
+            paths = list(self._subscribers)
+        return {path: copy.deepcopy(self.get(path)) for path in paths}
+    
+    def _notify_subscribers(self, old_values: Dict[str, Any]):
+        """通知值发生变化的配置项的订阅者
+        
+        Args:
+            old_values: 变化前的配置值
+        """
+        for path, old_value in old_values.items():
+            new_value = self.get(path)
+            if new_value == old_value:
+                continue
+            
+            with self._subscribers_lock:
+                refs = self._subscribers.get(path, [])
+                callbacks = [ref() for ref in refs]
+                # 清理已回收对象的订阅
+                self._subscribers[path] = [ref for ref, cb in zip(refs, callbacks) if cb is not None]
+            
+            for callback in callbacks:
+                if callback is None:
+                    continue
+                try:
+                    callback(new_value)
+                except Exception as e:
+                    logger.error(f"配置变更回调失败 {path}: {e}")
+    
     def save(self):
-        """保存配置到文件"""
+        """保存配置到文件
+        
+        只写入配置文件中的值和通过 set/update 修改的值，环境变量覆盖的值（如密钥）不落盘。
+        """
         try:
             with open(self.config_path, 'w', encoding='utf-8') as f:
-                yaml.safe_dump(self.config, f, allow_unicode=True)
+                yaml.dump(self._file_config, f, Dumper=_Dumper, allow_unicode=True)
+            
+            # 删除过期的 JSON 缓存文件
+            try:
+                os.remove(self._sidecar_path)
+            except FileNotFoundError:
+                pass
+            
+            # 刷新解析缓存，避免下次加载时重复解析
+            st = os.stat(self.config_path)
+            _YAML_CACHE[os.path.abspath(self.config_path)] = (
+                st.st_mtime_ns, st.st_size, copy.deepcopy(self._file_config))
             logger.info("配置保存完成")
         except Exception as e:
             logger.error(f"保存配置失败: {e}")
@@ -284,5 +650,27 @@ class ConfigManager:
         logger.info("配置重新加载完成")
 
 
-# 创建全局配置管理器实例
-config_manager = ConfigManager() 
\ No newline at end of file
+# 全局配置管理器实例，首次使用时创建，避免导入模块即读取配置文件
+_config_manager: Optional[ConfigManager] = None
+_config_manager_lock = Lock()
+
+
+def get_config_manager() -> ConfigManager:
+    """获取全局配置管理器实例
+    
+    Returns:
+        ConfigManager: 全局配置管理器
+    """
+    global _config_manager
+    if _config_manager is None:
+        with _config_manager_lock:
+            if _config_manager is None:
+                _config_manager = ConfigManager()
+    return _config_manager
+
+
+def __getattr__(name: str) -> Any:
+    """兼容 `from src.core.config_manager import config_manager` 的用法"""
+    if name == 'config_manager':
+        return get_config_manager()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}") 
\ No newline at end of file
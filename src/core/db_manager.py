@@ -9,27 +9,55 @@
 """
 
 import os
+import glob
+import time
 import logging
 import sqlite3
-from typing import Optional, Dict, List, Set, Tuple
-from datetime import datetime
+from contextlib import closing
+from typing import Optional, Dict, Iterator, List, Set, Tuple
 from pathlib import Path
 from threading import Lock
 
-from .config_manager import config_manager
+from .config_manager import get_config_manager
 
 logger = logging.getLogger(__name__)
 
 class DatabaseManager:
     """数据库管理器"""
     
+    # iter_files 每批读取的记录数
+    ITER_BATCH_SIZE = 1000
+    
+    # 单条语句写入整行并更新检查时间，changed 记录本次是否新增或大小、修改时间变化，
+    # SET 中的 files.* 取更新前的值，RETURNING 只能看到更新后的行，因此借助该列返回结果
+    _UPSERT_CHANGED_SQL = """
+        INSERT INTO files (
+            path, size, modified_time, is_directory,
+            parent_path, drive_id, last_check, changed
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, 1)
+        ON CONFLICT(path) DO UPDATE SET
+            size = excluded.size,
+            modified_time = excluded.modified_time,
+            is_directory = excluded.is_directory,
+            parent_path = excluded.parent_path,
+            drive_id = excluded.drive_id,
+            last_check = excluded.last_check,
+            changed = (files.modified_time IS NOT excluded.modified_time
+                       OR files.size IS NOT excluded.size)
+        RETURNING changed
+    """
+    
+    # 对外返回的文件记录列
+    _FILE_COLUMNS = "path, size, modified_time, is_directory, parent_path, drive_id, last_check"
+    
     def __init__(self):
         """初始化数据库管理器"""
         # 获取配置
-        self.db_path = config_manager.get('database.path')
-        self.backup_count = config_manager.get('database.backup_count')
-        self.backup_interval = config_manager.get('database.backup_interval')
-        self.vacuum_threshold = config_manager.get('database.vacuum_threshold')
+        db_config = get_config_manager().c.database
+        self.db_path = db_config.path
+        self.backup_count = db_config.backup_count
+        self.backup_interval = db_config.backup_interval
+        self.vacuum_threshold = db_config.vacuum_threshold
         
         # 确保数据库目录存在
         os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
@@ -37,12 +65,44 @@ class DatabaseManager:
         # 初始化锁
         self.db_lock = Lock()
         
+        # 建立数据库长连接，所有操作通过 db_lock 串行访问
+        self._conn = self._connect()
+        
         # 初始化数据库
         self.init_database()
         
         # 检查是否需要整理数据库
         self._check_vacuum_needed()
     
+    def _connect(self) -> sqlite3.Connection:
+        """创建数据库连接并设置性能相关的 PRAGMA
+        
+        Returns:
+            sqlite3.Connection: 自动提交模式的数据库连接
+        """
+        conn = sqlite3.connect(self.db_path, check_same_thread=False,
+                               isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA mmap_size=268435456")
+        conn.execute("PRAGMA cache_size=-65536")
+        
+        # 用于 compare_files 的临时表，仅对当前连接可见
+        conn.execute("""
+            CREATE TEMP TABLE IF NOT EXISTS scan (
+                path TEXT PRIMARY KEY,
+                size INTEGER,
+                modified_time INTEGER
+            )
+        """)
+        return conn
+    
+    def close(self):
+        """关闭数据库连接"""
+        with self.db_lock:
+            self._conn.close()
+    
     def _check_vacuum_needed(self):
         """检查是否需要整理数据库"""
         try:
@@ -58,8 +118,8 @@ class DatabaseManager:
         """整理数据库，回收未使用的空间"""
         with self.db_lock:
             try:
-                with sqlite3.connect(self.db_path) as conn:
-                    conn.execute("VACUUM")
+                # 自动提交模式下没有活动事务，可以直接执行
+                self._conn.execute("VACUUM")
                 logger.info("数据库整理完成")
             except Exception as e:
                 logger.error(f"数据库整理失败: {e}")
@@ -68,8 +128,9 @@ class DatabaseManager:
         """初始化数据库结构"""
         with self.db_lock:
             try:
-                with sqlite3.connect(self.db_path) as conn:
+                with self._conn as conn:
                     cursor = conn.cursor()
+                    cursor.execute("BEGIN")
                     
                     # 创建文件表
                     cursor.execute("""
@@ -81,15 +142,26 @@ class DatabaseManager:
                             parent_path TEXT,
                             drive_id TEXT,  -- Google Drive 文件 ID
                             last_check INTEGER NOT NULL,  -- 最后检查时间
+                            changed INTEGER NOT NULL DEFAULT 0,  -- 最近一次写入是否有变化
                             FOREIGN KEY (parent_path) REFERENCES files (path)
                         )
                     """)
                     
+                    # 旧数据库补充 changed 列
+                    columns = {row[1] for row in cursor.execute("PRAGMA table_info(files)")}
+                    if 'changed' not in columns:
+                        cursor.execute(
+                            "ALTER TABLE files ADD COLUMN changed INTEGER NOT NULL DEFAULT 0"
+                        )
+                    
                     # 创建索引
+                    # (parent_path, is_directory) 复合索引同时覆盖仅按 parent_path 的查询，
+                    # 旧的单列索引已冗余，删除以减少写入开销
                     cursor.execute("""
-                        CREATE INDEX IF NOT EXISTS idx_parent_path 
-                        ON files (parent_path)
+                        CREATE INDEX IF NOT EXISTS idx_parent_isdir 
+                        ON files (parent_path, is_directory)
                     """)
+                    cursor.execute("DROP INDEX IF EXISTS idx_parent_path")
                     cursor.execute("""
                         CREATE INDEX IF NOT EXISTS idx_drive_id 
                         ON files (drive_id)
@@ -100,7 +172,18 @@ class DatabaseManager:
                     """)
                     
                     conn.commit()
-                    logger.info("数据库初始化完成")
+                
+                # 复合索引尚无统计信息时收集一次，便于查询规划器选择合适的索引
+                try:
+                    has_stats = self._conn.execute(
+                        "SELECT 1 FROM sqlite_stat1 WHERE idx = 'idx_parent_isdir'"
+                    ).fetchone()
+                except sqlite3.OperationalError:
+                    has_stats = None
+                if not has_stats:
+                    self._conn.execute("ANALYZE files")
+                
+                logger.info("数据库初始化完成")
                     
             except Exception as e:
                 logger.error(f"初始化数据库失败: {e}")
@@ -124,53 +207,91 @@ class DatabaseManager:
         """
         with self.db_lock:
             try:
-                with sqlite3.connect(self.db_path) as conn:
+                current_time = int(time.time())
+                with self._conn as conn:
                     cursor = conn.cursor()
+                    cursor.execute("BEGIN")
                     
-                    # 检查是否存在
-                    cursor.execute(
-                        "SELECT modified_time FROM files WHERE path = ?",
-                        (path,)
-                    )
-                    result = cursor.fetchone()
-                    
-                    current_time = int(datetime.now().timestamp())
-                    is_new_or_modified = True
-                    
-                    if result:
-                        # 如果文件存在且修改时间相同，则不更新
-                        if result[0] == modified_time:
-                            cursor.execute(
-                                "UPDATE files SET last_check = ? WHERE path = ?",
-                                (current_time, path)
-                            )
-                            is_new_or_modified = False
-                        else:
-                            # 更新记录
-                            cursor.execute("""
-                                UPDATE files 
-                                SET size = ?, modified_time = ?, is_directory = ?,
-                                    parent_path = ?, drive_id = ?, last_check = ?
-                                WHERE path = ?
-                            """, (size, modified_time, is_directory, parent_path,
-                                 drive_id, current_time, path))
-                    else:
-                        # 插入新记录
-                        cursor.execute("""
-                            INSERT INTO files (
-                                path, size, modified_time, is_directory,
-                                parent_path, drive_id, last_check
-                            ) VALUES (?, ?, ?, ?, ?, ?, ?)
-                        """, (path, size, modified_time, is_directory, parent_path,
-                              drive_id, current_time))
-                    
-                    conn.commit()
-                    return is_new_or_modified
+                    cursor.execute(self._UPSERT_CHANGED_SQL, (
+                        path, size, modified_time, is_directory, parent_path,
+                        drive_id, current_time))
+                    return bool(cursor.fetchone()[0])
                     
             except Exception as e:
                 logger.error(f"添加文件记录失败 {path}: {e}")
                 return False
     
+    def add_files(self, rows: List[Tuple]) -> int:
+        """批量添加或更新文件记录
+        
+        在单个事务中写入全部记录，适用于全量扫描等大批量场景。
+        
+        Args:
+            rows: 文件记录列表，每项为
+                (path, size, modified_time, is_directory, parent_path, drive_id)
+            
+        Returns:
+            int: 写入的记录数量，失败时返回 0
+        """
+        if not rows:
+            return 0
+        
+        with self.db_lock:
+            try:
+                current_time = int(time.time())
+                with self._conn as conn:
+                    conn.execute("BEGIN")
+                    conn.executemany("""
+                        INSERT INTO files (
+                            path, size, modified_time, is_directory,
+                            parent_path, drive_id, last_check
+                        ) VALUES (?, ?, ?, ?, ?, ?, ?)
+                        ON CONFLICT(path) DO UPDATE SET
+                            size = excluded.size,
+                            modified_time = excluded.modified_time,
+                            is_directory = excluded.is_directory,
+                            parent_path = excluded.parent_path,
+                            drive_id = excluded.drive_id,
+                            last_check = excluded.last_check
+                    """, (row + (current_time,) for row in rows))
+                return len(rows)
+                
+            except Exception as e:
+                logger.error(f"批量添加文件记录失败: {e}")
+                return 0
+    
+    def upsert_files(self, rows: List[Tuple]) -> List[str]:
+        """批量添加或更新文件记录，并返回有变化的路径
+        
+        与 add_file 语义相同，但全部记录在单个事务中写入。
+        
+        Args:
+            rows: 文件记录列表，每项为
+                (path, size, modified_time, is_directory, parent_path, drive_id)
+            
+        Returns:
+            List[str]: 新增或大小、修改时间变化的文件路径，失败时返回空列表
+        """
+        if not rows:
+            return []
+        
+        with self.db_lock:
+            try:
+                current_time = int(time.time())
+                changed = []
+                with self._conn as conn:
+                    cursor = conn.cursor()
+                    cursor.execute("BEGIN")
+                    for row in rows:
+                        cursor.execute(self._UPSERT_CHANGED_SQL, row + (current_time,))
+                        if cursor.fetchone()[0]:
+                            changed.append(row[0])
+                return changed
+                
+            except Exception as e:
+                logger.error(f"批量更新文件记录失败: {e}")
+                return []
+    
     def get_file(self, path: str) -> Optional[Dict]:
         """获取文件记录
         
@@ -182,10 +303,10 @@ class DatabaseManager:
         """
         with self.db_lock:
             try:
-                with sqlite3.connect(self.db_path) as conn:
+                with self._conn as conn:
                     cursor = conn.cursor()
                     cursor.execute(
-                        "SELECT * FROM files WHERE path = ?",
+                        f"SELECT {self._FILE_COLUMNS} FROM files WHERE path = ?",
                         (path,)
                     )
                     result = cursor.fetchone()
@@ -206,10 +327,59 @@ class DatabaseManager:
                 logger.error(f"获取文件记录失败 {path}: {e}")
                 return None
     
+    def iter_files(self, parent_path: Optional[str] = None,
+                   is_directory: Optional[bool] = None) -> Iterator[sqlite3.Row]:
+        """逐行遍历文件记录
+        
+        按路径分批读取，每批查询单独加锁，迭代过程中不持有数据库锁，
+        内存占用与结果集大小无关。只需遍历结果的调用方应优先使用本方法。
+        
+        Args:
+            parent_path: 父目录路径，None 表示列出所有记录
+            is_directory: 是否只列出目录或文件
+            
+        Yields:
+            sqlite3.Row: 文件记录，支持按列名访问
+        """
+        conditions = ["path > ?"]
+        params: List = []
+        
+        if parent_path is not None:
+            conditions.append("parent_path = ?")
+            params.append(parent_path)
+        
+        if is_directory is not None:
+            conditions.append("is_directory = ?")
+            params.append(is_directory)
+        
+        query = (f"SELECT {self._FILE_COLUMNS} FROM files WHERE " + " AND ".join(conditions) +
+                 " ORDER BY path LIMIT ?")
+        
+        last_path = ''
+        while True:
+            with self.db_lock:
+                try:
+                    cursor = self._conn.cursor()
+                    cursor.row_factory = sqlite3.Row
+                    rows = cursor.execute(
+                        query, [last_path, *params, self.ITER_BATCH_SIZE]
+                    ).fetchall()
+                except Exception as e:
+                    logger.error(f"遍历文件记录失败: {e}")
+                    return
+            
+            yield from rows
+            
+            if len(rows) < self.ITER_BATCH_SIZE:
+                return
+            last_path = rows[-1]['path']
+    
     def list_files(self, parent_path: Optional[str] = None,
                    is_directory: Optional[bool] = None) -> List[Dict]:
         """列出文件记录
         
+        会一次性构建完整列表，仅需遍历时请使用 iter_files。
+        
         Args:
             parent_path: 父目录路径，None 表示列出所有记录
             is_directory: 是否只列出目录或文件
@@ -217,42 +387,15 @@ class DatabaseManager:
         Returns:
             List[Dict]: 文件记录列表
         """
-        with self.db_lock:
-            try:
-                with sqlite3.connect(self.db_path) as conn:
-                    cursor = conn.cursor()
-                    
-                    query = "SELECT * FROM files"
-                    params = []
-                    conditions = []
-                    
-                    if parent_path is not None:
-                        conditions.append("parent_path = ?")
-                        params.append(parent_path)
-                    
-                    if is_directory is not None:
-                        conditions.append("is_directory = ?")
-                        params.append(is_directory)
-                    
-                    if conditions:
-                        query += " WHERE " + " AND ".join(conditions)
-                    
-                    cursor.execute(query, params)
-                    results = cursor.fetchall()
-                    
-                    return [{
-                        'path': row[0],
-                        'size': row[1],
-                        'modified_time': row[2],
-                        'is_directory': bool(row[3]),
-                        'parent_path': row[4],
-                        'drive_id': row[5],
-                        'last_check': row[6]
-                    } for row in results]
-                    
-            except Exception as e:
-                logger.error(f"列出文件记录失败: {e}")
-                return []
+        return [{
+            'path': row['path'],
+            'size': row['size'],
+            'modified_time': row['modified_time'],
+            'is_directory': bool(row['is_directory']),
+            'parent_path': row['parent_path'],
+            'drive_id': row['drive_id'],
+            'last_check': row['last_check']
+        } for row in self.iter_files(parent_path, is_directory)]
     
     def compare_files(self, current_files: List[Dict]) -> Tuple[List[Dict], List[Dict], List[str]]:
         """比较文件变化
@@ -266,34 +409,43 @@ class DatabaseManager:
         """
         with self.db_lock:
             try:
-                with sqlite3.connect(self.db_path) as conn:
+                with self._conn as conn:
                     cursor = conn.cursor()
+                    cursor.execute("BEGIN")
                     
-                    # 获取当前路径集合
-                    current_paths = {f['path'] for f in current_files}
+                    # 将当前文件写入临时表，由 SQLite 完成集合比较
+                    cursor.execute("DELETE FROM scan")
+                    cursor.executemany(
+                        "INSERT OR REPLACE INTO scan (path, size, modified_time) VALUES (?, ?, ?)",
+                        ((f['path'], f['size'], f['modified_time']) for f in current_files)
+                    )
+                    current_by_path = {f['path']: f for f in current_files}
                     
-                    # 获取数据库中的文件记录
-                    cursor.execute("SELECT path, size, modified_time FROM files")
-                    db_files = {row[0]: {'size': row[1], 'modified_time': row[2]} 
-                              for row in cursor.fetchall()}
+                    # 新增文件
+                    cursor.execute("""
+                        SELECT s.path FROM scan s
+                        LEFT JOIN files f ON f.path = s.path
+                        WHERE f.path IS NULL
+                    """)
+                    new_files = [current_by_path[row[0]] for row in cursor]
                     
-                    # 找出新增、修改和删除的文件
-                    new_files = []
-                    modified_files = []
-                    deleted_paths = []
+                    # 修改文件
+                    cursor.execute("""
+                        SELECT s.path FROM scan s
+                        JOIN files f ON f.path = s.path
+                        WHERE s.size <> f.size OR s.modified_time <> f.modified_time
+                    """)
+                    modified_files = [current_by_path[row[0]] for row in cursor]
                     
-                    # 检查新增和修改的文件
-                    for file in current_files:
-                        path = file['path']
-                        if path not in db_files:
-                            new_files.append(file)
-                        elif (file['size'] != db_files[path]['size'] or 
-                              file['modified_time'] != db_files[path]['modified_time']):
-                            modified_files.append(file)
+                    # 删除文件
+                    cursor.execute("""
+                        SELECT f.path FROM files f
+                        LEFT JOIN scan s ON s.path = f.path
+                        WHERE s.path IS NULL
+                    """)
+                    deleted_paths = [row[0] for row in cursor]
                     
-                    # 检查删除的文件
-                    deleted_paths = [path for path in db_files 
-                                   if path not in current_paths]
+                    cursor.execute("DELETE FROM scan")
                     
                     return new_files, modified_files, deleted_paths
                     
@@ -312,7 +464,7 @@ class DatabaseManager:
         """
         with self.db_lock:
             try:
-                with sqlite3.connect(self.db_path) as conn:
+                with self._conn as conn:
                     cursor = conn.cursor()
                     cursor.execute(
                         "DELETE FROM files WHERE path = ?",
@@ -336,10 +488,10 @@ class DatabaseManager:
         """
         with self.db_lock:
             try:
-                current_time = int(datetime.now().timestamp())
+                current_time = int(time.time())
                 cutoff_time = current_time - max_age
                 
-                with sqlite3.connect(self.db_path) as conn:
+                with self._conn as conn:
                     cursor = conn.cursor()
                     cursor.execute(
                         "DELETE FROM files WHERE last_check < ?",
@@ -360,24 +512,48 @@ class DatabaseManager:
         """
         try:
             # 生成备份文件名
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+            timestamp = time.strftime('%Y%m%d_%H%M%S')
             backup_path = f"{self.db_path}.{timestamp}.bak"
             
-            # 复制数据库文件
-            with open(self.db_path, 'rb') as src, open(backup_path, 'wb') as dst:
-                dst.write(src.read())
+            # 使用 SQLite 在线备份接口按页复制，内存占用恒定且与写入操作一致
+            with self.db_lock, closing(sqlite3.connect(backup_path)) as dst:
+                self._conn.backup(dst, pages=1024)
             
-            # 清理旧备份
-            backup_files = sorted([f for f in os.listdir(os.path.dirname(self.db_path))
-                                 if f.startswith(os.path.basename(self.db_path)) 
-                                 and f.endswith('.bak')])
-            
-            while len(backup_files) > self.backup_count:
-                os.remove(os.path.join(os.path.dirname(self.db_path), backup_files.pop(0)))
+            # 清理旧备份，按修改时间保留最新的 backup_count 个
+            backup_files = sorted(glob.glob(f"{glob.escape(self.db_path)}.*.bak"),
+                                  key=os.path.getmtime)
+            for old_backup in backup_files[:max(len(backup_files) - self.backup_count, 0)]:
+                os.remove(old_backup)
             
             logger.info(f"数据库备份完成: {backup_path}")
             return True
             
         except Exception as e:
             logger.error(f"备份数据库失败: {e}")
-            return False 
\ No newline at end of file
+            return False
+
+
+# 进程内共享的数据库管理器实例，所有模块复用同一个连接，首次使用时创建
+_db_manager: Optional[DatabaseManager] = None
+_db_manager_lock = Lock()
+
+
+def get_db_manager() -> DatabaseManager:
+    """获取全局数据库管理器实例
+    
+    Returns:
+        DatabaseManager: 全局数据库管理器
+    """
+    global _db_manager
+    if _db_manager is None:
+        with _db_manager_lock:
+            if _db_manager is None:
+                _db_manager = DatabaseManager()
+    return _db_manager
+
+
+def __getattr__(name: str):
+    """支持 `from .db_manager import db_manager` 的用法"""
+    if name == 'db_manager':
+        return get_db_manager()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}") 
\ No newline at end of file
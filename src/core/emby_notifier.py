@@ -9,27 +9,78 @@ Emby 通知模块
 
 import os
 import time
+import random
 import logging
 import requests
-from typing import Dict, List, Optional
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from email.utils import parsedate_to_datetime
+from requests.adapters import HTTPAdapter
+from typing import Dict, Iterable, List, Optional, Tuple
 from pathlib import Path
+from threading import Lock
 
-from .config_manager import config_manager
+from .config_manager import get_config_manager
 
 logger = logging.getLogger(__name__)
 
+# 路径缓存未命中标记，媒体库ID 可能缓存为 None
+_MISSING = object()
+
 class EmbyNotifier:
     """Emby 通知器"""
     
+    # 媒体库列表缓存时间（秒），媒体库变化频率很低
+    LIBRARY_CACHE_TTL = 300
+    
+    # 路径 -> 媒体库映射缓存的最大条目数
+    PATH_CACHE_SIZE = 1024
+    
+    # 并发刷新媒体库的最大线程数，不超过连接池大小(16)
+    MAX_REFRESH_WORKERS = 8
+    
+    # 重试等待时间上限（秒）
+    MAX_RETRY_DELAY = 60
+    
+    # 可重试的 4xx 状态码，其余 4xx 属于请求本身错误，重试无意义
+    RETRIABLE_STATUS = (408, 429)
+    
     def __init__(self):
         """初始化 Emby 通知器"""
+        config_manager = get_config_manager()
         self.server_url = config_manager.get('emby.server_url')
         self.api_key = config_manager.get('emby.api_key')
         self.retry_count = config_manager.get('emby.retry_count')
         self.retry_interval = config_manager.get('emby.retry_interval')
         
+        # 媒体库缓存: (获取时间, 媒体库列表, [(以分隔符结尾的媒体库绝对路径, 媒体库ID)])
+        self._lib_cache: Optional[Tuple[float, List[Dict], List[Tuple[str, str]]]] = None
+        
+        # 媒体库列表响应的 (ETag, Last-Modified)，用于条件请求
+        self._lib_validators: Optional[Tuple[Optional[str], Optional[str]]] = None
+        
+        # 路径 -> 媒体库ID 的 LRU 缓存，多个线程可能同时刷新，访问需持有锁
+        self._path_lib_cache: OrderedDict = OrderedDict()
+        self._path_lib_lock = Lock()
+        
         if not self.server_url or not self.api_key:
             logger.warning("Emby 配置不完整")
+        
+        # 复用 HTTP 连接，避免每次请求重新建立 TCP/TLS 连接
+        self._session = requests.Session()
+        self._session.headers.update(self._get_headers())
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=0)
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+        
+        # 长期复用的刷新线程池，工作线程按需创建并在空闲时保留
+        self._pool = ThreadPoolExecutor(max_workers=self.MAX_REFRESH_WORKERS,
+                                        thread_name_prefix='emby-refresh')
+    
+    def close(self):
+        """关闭刷新线程池和 HTTP 会话，释放连接池中的连接"""
+        self._pool.shutdown(wait=True)
+        self._session.close()
     
     def _get_headers(self) -> Dict:
         """获取请求头"""
@@ -39,38 +90,134 @@ class EmbyNotifier:
         }
     
     def _make_request(self, method: str, endpoint: str, **kwargs) -> Dict:
-        """发送请求到 Emby 服务器"""
+        """发送请求到 Emby 服务器并解析 JSON 响应"""
+        response = self._send_request(method, endpoint, **kwargs)
+        return response.json() if response.content else {}
+    
+    def _send_request(self, method: str, endpoint: str, **kwargs) -> requests.Response:
+        """发送请求到 Emby 服务器
+        
+        失败时按指数退避加随机抖动重试，不可重试的 4xx 响应直接抛出异常。
+        """
         url = f"{self.server_url}/emby{endpoint}"
-        headers = self._get_headers()
         
         for attempt in range(self.retry_count):
+            response = None
             try:
-                response = requests.request(
+                response = self._session.request(
                     method,
                     url,
-                    headers=headers,
-                    timeout=30,
+                    timeout=(3, 10),  # (连接超时, 读取超时)
                     **kwargs
                 )
                 response.raise_for_status()
-                return response.json() if response.content else {}
+                return response
                 
             except requests.exceptions.RequestException as e:
+                status = response.status_code if response is not None else None
+                if status is not None and 400 <= status < 500 and status not in self.RETRIABLE_STATUS:
+                    logger.error(f"请求失败，状态码 {status} 不可重试: {e}")
+                    raise
                 if attempt < self.retry_count - 1:
-                    logger.warning(f"请求失败，将在 {self.retry_interval} 秒后重试: {e}")
-                    time.sleep(self.retry_interval)
+                    delay = self._retry_delay(attempt, response)
+                    logger.warning(f"请求失败，将在 {delay:.1f} 秒后重试: {e}")
+                    time.sleep(delay)
                 else:
                     logger.error(f"请求失败，已达到最大重试次数: {e}")
                     raise
     
-    def _get_libraries(self) -> List[Dict]:
-        """获取媒体库列表"""
+    def _retry_delay(self, attempt: int, response: Optional[requests.Response] = None) -> float:
+        """计算下一次重试前的等待时间
+        
+        Args:
+            attempt: 当前重试次数（从 0 开始）
+            response: 最近一次的响应，429 时读取 Retry-After
+            
+        Returns:
+            float: 等待秒数
+        """
+        if response is not None and response.status_code == 429:
+            retry_after = response.headers.get('Retry-After')
+            if retry_after:
+                try:
+                    return min(float(retry_after), self.MAX_RETRY_DELAY)
+                except ValueError:
+                    try:
+                        wait = parsedate_to_datetime(retry_after).timestamp() - time.time()
+                        return min(max(wait, 0.0), self.MAX_RETRY_DELAY)
+                    except (TypeError, ValueError):
+                        pass
+        
+        delay = min(self.retry_interval * (2 ** attempt), self.MAX_RETRY_DELAY)
+        return delay + random.uniform(0, 1)
+    
+    def _load_libraries(self) -> Optional[Tuple[float, List[Dict], List[Tuple[str, str]]]]:
+        """获取媒体库列表，在缓存有效期内直接返回缓存
+        
+        Returns:
+            Optional[Tuple]: (获取时间, 媒体库列表, 媒体库路径索引)，获取失败时返回 None
+        """
+        cached = self._lib_cache
+        if cached and time.monotonic() - cached[0] < self.LIBRARY_CACHE_TTL:
+            return cached
+        
+        # 已有缓存时发送条件请求，媒体库未变化时服务器返回 304 且不带响应体
+        headers = {}
+        if cached and self._lib_validators:
+            etag, last_modified = self._lib_validators
+            if etag:
+                headers['If-None-Match'] = etag
+            if last_modified:
+                headers['If-Modified-Since'] = last_modified
+        
         try:
-            response = self._make_request('GET', '/Library/VirtualFolders')
-            return response
+            response = self._send_request('GET', '/Library/VirtualFolders', headers=headers)
+            if response.status_code == 304 and cached:
+                self._lib_cache = (time.monotonic(), cached[1], cached[2])
+                return self._lib_cache
+            libraries = response.json() if response.content else []
         except Exception as e:
             logger.error(f"获取媒体库列表失败: {e}")
-            return []
+            return None
+        
+        self._lib_validators = (response.headers.get('ETag'),
+                                response.headers.get('Last-Modified'))
+        # 路径统一以分隔符结尾，避免 /media/tv 误匹配 /media/tv2；
+        # 按路径长度降序排列，嵌套的媒体库根目录优先匹配最长前缀
+        locations = sorted(
+            ((os.path.join(os.path.abspath(library['Path']), ''), library['Id'])
+             for library in libraries if library.get('Path')),
+            key=lambda location: len(location[0]),
+            reverse=True
+        )
+        self._lib_cache = (time.monotonic(), libraries, locations)
+        with self._path_lib_lock:
+            self._path_lib_cache.clear()
+        return self._lib_cache
+    
+    def _get_libraries(self) -> List[Dict]:
+        """获取媒体库列表"""
+        cached = self._load_libraries()
+        return cached[1] if cached else []
+    
+    def _find_library_for_path(self, path: str,
+                               locations: List[Tuple[str, str]]) -> Optional[str]:
+        """查找包含指定路径的媒体库
+        
+        Args:
+            path: 绝对路径
+            locations: 媒体库路径索引 [(以分隔符结尾的媒体库绝对路径, 媒体库ID)]，
+                按路径长度降序
+            
+        Returns:
+            Optional[str]: 媒体库ID，未找到时返回 None
+        """
+        # 补上分隔符，使媒体库根目录本身也能匹配
+        path = os.path.join(path, '')
+        for location, library_id in locations:
+            if path.startswith(location):
+                return library_id
+        return None
     
     def _refresh_library(self, library_id: str) -> Dict:
         """刷新指定媒体库"""
@@ -87,41 +234,100 @@ class EmbyNotifier:
     def refresh_library(self, path: str) -> Dict:
         """刷新指定路径的媒体库"""
         try:
-            # 获取所有媒体库
-            libraries = self._get_libraries()
+            # 在缓存的媒体库路径索引中查找包含指定路径的媒体库
+            cached = self._load_libraries()
+            locations = cached[2] if cached else []
+            library_id = self._find_library_for_path(os.path.abspath(path), locations)
             
-            # 找到包含指定路径的媒体库
-            target_library = None
-            for library in libraries:
-                if path.startswith(library.get('Path', '')):
-                    target_library = library
-                    break
-            
-            if not target_library:
+            if library_id is None:
                 return {
                     'status': 'error',
                     'message': f'未找到包含路径 {path} 的媒体库'
                 }
             
             # 刷新找到的媒体库
-            return self._refresh_library(target_library['Id'])
+            return self._refresh_library(library_id)
             
         except Exception as e:
             logger.error(f"刷新媒体库失败: {e}")
             return {'status': 'error', 'message': str(e)}
     
+    def refresh_multiple(self, paths: Iterable[str]) -> Dict[str, bool]:
+        """批量刷新多个路径所在的媒体库，每个媒体库只刷新一次
+        
+        Args:
+            paths: 路径集合
+            
+        Returns:
+            Dict[str, bool]: 路径 -> 是否刷新成功
+        """
+        cached = self._load_libraries()
+        locations = cached[2] if cached else []
+        
+        # 按媒体库分组
+        results = {}
+        groups: Dict[str, List[str]] = {}
+        path_cache = self._path_lib_cache
+        for path in paths:
+            # 调用方传入的是待刷新目录，直接以路径本身为键，
+            # 取父目录会让 /links/movies 与 /links/tv 共用同一缓存项
+            abs_path = os.path.abspath(path)
+            with self._path_lib_lock:
+                library_id = path_cache.get(abs_path, _MISSING)
+                if library_id is not _MISSING:
+                    path_cache.move_to_end(abs_path)
+            if library_id is _MISSING:
+                library_id = self._find_library_for_path(abs_path, locations)
+                with self._path_lib_lock:
+                    path_cache[abs_path] = library_id
+                    if len(path_cache) > self.PATH_CACHE_SIZE:
+                        path_cache.popitem(last=False)
+            
+            if library_id is None:
+                logger.warning(f"未找到包含路径 {path} 的媒体库")
+                results[path] = False
+            else:
+                groups.setdefault(library_id, []).append(path)
+        
+        # 每个媒体库刷新一次，多个媒体库时并发请求
+        if len(groups) > 1:
+            futures = {
+                self._pool.submit(self._refresh_library, library_id): library_id
+                for library_id in groups
+            }
+            refreshed = {
+                futures[future]: future.result()
+                for future in as_completed(futures)
+            }
+        else:
+            refreshed = {library_id: self._refresh_library(library_id)
+                         for library_id in groups}
+        
+        for library_id, library_paths in groups.items():
+            success = refreshed[library_id]['status'] == 'success'
+            for path in library_paths:
+                results[path] = success
+        
+        return results
+    
     def refresh_all(self) -> Dict:
         """刷新所有媒体库"""
         try:
             libraries = self._get_libraries()
-            results = []
+            if not libraries:
+                return {'status': 'success', 'results': []}
+            
+            # 各媒体库的刷新请求互不依赖，并发发送
+            futures = [self._pool.submit(self._refresh_library, library['Id'])
+                       for library in libraries]
+            
+            results = [{
+                'library': library['Name'],
+                'result': future.result()
+            } for library, future in zip(libraries, futures)]
             
-            for library in libraries:
-                result = self._refresh_library(library['Id'])
-                results.append({
-                    'library': library['Name'],
-                    'result': result
-                })
+            # 全量刷新后媒体库可能有变化，下次使用时重新获取
+            self._lib_cache = None
             
             return {
                 'status': 'success',
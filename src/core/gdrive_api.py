@@ -9,11 +9,11 @@ Google Drive API 监控模块
 """
 
 import os
-import time
+import random
 import logging
+from collections import OrderedDict
 from typing import Dict, List, Optional
-from datetime import datetime, timedelta
-from pathlib import Path
+from datetime import datetime, timedelta, timezone
 from threading import Thread, Event
 
 from google.oauth2.credentials import Credentials
@@ -23,27 +23,41 @@ from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 
-from .config_manager import config_manager
-from .db_manager import DatabaseManager
+from .config_manager import get_config_manager
+from .db_manager import get_db_manager
 from .task_queue import TaskQueue
+from .symlink_manager import SymlinkManager
 
 logger = logging.getLogger(__name__)
 
 class GoogleDriveAPI:
     """Google Drive API 管理器"""
     
+    # 监控出错后重试的最长等待时间（秒）
+    MAX_ERROR_BACKOFF = 300
+    
+    # 文件夹元数据缓存的最大条目数
+    FOLDER_CACHE_SIZE = 4096
+    
+    # 单次批量请求包含的最大请求数（Drive API 上限为 100）
+    BATCH_REQUEST_SIZE = 100
+    
     def __init__(self):
         """初始化 Google Drive API 管理器"""
         # 获取配置
+        config_manager = get_config_manager()
         self.folder_id = config_manager.get('google_drive.folder_id')
         self.api_call_interval = config_manager.get('google_drive.api_call_interval')
         self.credentials_path = config_manager.get('google_drive.credentials_path')
         self.token_path = config_manager.get('google_drive.token_path')
         
         # 初始化组件
-        self.db = DatabaseManager()
+        self.db = get_db_manager()
         self.task_queue = TaskQueue()
         
+        # 所有文件活动共用一个软链接管理器，避免每次创建新的 Emby 会话和线程池
+        self.symlink_mgr = SymlinkManager()
+        
         # 初始化认证
         self.credentials = self._get_credentials()
         
@@ -51,6 +65,9 @@ class GoogleDriveAPI:
         self.service = build('drive', 'v3', credentials=self.credentials)
         self.activity_service = build('driveactivity', 'v2', credentials=self.credentials)
         
+        # 文件夹 ID -> 元数据 的 LRU 缓存，用于逐级解析文件路径
+        self._folder_cache: OrderedDict = OrderedDict()
+        
         # 初始化停止事件
         self.stop_event = Event()
         
@@ -92,7 +109,7 @@ class GoogleDriveAPI:
         """启动监控"""
         try:
             # 启动监控线程
-            self.monitor_thread = Thread(target=self._monitor_changes)
+            self.monitor_thread = Thread(target=self._monitor_changes, daemon=True)
             self.monitor_thread.start()
             logger.info(f"启动 Google Drive 监控，间隔 {self.api_call_interval} 秒")
             
@@ -111,31 +128,46 @@ class GoogleDriveAPI:
                 self.monitor_thread.join()
                 logger.info("停止 Google Drive 监控")
             
+            # 发送剩余的刷新通知并释放 Emby 连接
+            self.symlink_mgr.close()
+            
         except Exception as e:
             logger.error(f"停止监控失败: {e}")
             raise
     
     def _monitor_changes(self):
         """监控文件变化"""
+        failures = 0
         while not self.stop_event.is_set():
             try:
                 # 获取文件活动
                 activities = self._get_activities()
                 
-                # 处理文件变化
-                for activity in activities:
-                    self._process_activity(activity)
+                # 批量获取本轮涉及文件的元数据，再逐个处理文件变化
+                file_ids = [self._get_activity_file_id(activity) for activity in activities]
+                files = self._fetch_files([fid for fid in file_ids if fid])
+                self._prefetch_folders(files.values())
+                
+                for activity, file_id in zip(activities, file_ids):
+                    if file_id in files:
+                        self._process_activity(activity, files[file_id])
                 
                 # 更新检查时间
                 self.last_check_time = datetime.utcnow()
                 
+                # 汇总新建的软链接通知 Emby 刷新，任务异步执行，未完成的留到下一轮
+                self.symlink_mgr.notify_emby()
+                
                 # 等待下次检查
+                failures = 0
                 self.stop_event.wait(self.api_call_interval)
                 
             except Exception as e:
                 logger.error(f"监控文件变化失败: {e}")
-                # 出错后等待一段时间再重试
-                time.sleep(min(self.api_call_interval, 60))
+                # 出错后按指数退避加随机抖动等待，连续失败时逐步拉长间隔
+                delay = min(min(self.api_call_interval, 60) * 2 ** failures, self.MAX_ERROR_BACKOFF)
+                failures += 1
+                self.stop_event.wait(delay * random.uniform(0.8, 1.2))
     
     def _get_activities(self) -> List[Dict]:
         """获取文件活动
@@ -159,28 +191,129 @@ class GoogleDriveAPI:
             logger.error(f"获取文件活动失败: {e}")
             return []
     
-    def _process_activity(self, activity: Dict):
-        """处理文件活动
+    @staticmethod
+    def _get_activity_file_id(activity: Dict) -> Optional[str]:
+        """获取文件活动对应的文件 ID
         
         Args:
             activity: 文件活动信息
+            
+        Returns:
+            Optional[str]: 文件 ID，活动不包含文件时返回 None
         """
-        try:
-            # 获取文件 ID
-            targets = activity.get('targets', [])
-            if not targets:
-                return
+        targets = activity.get('targets', [])
+        if not targets:
+            return None
+        return targets[0].get('driveItem', {}).get('name', '').split('/')[-1] or None
+    
+    def _batch_get(self, ids: List[str], fields: str) -> Dict[str, Dict]:
+        """通过批量请求获取多个文件的元数据
+        
+        Args:
+            ids: 文件 ID 列表
+            fields: 需要返回的字段
             
-            # 获取文件信息
-            file_id = targets[0].get('driveItem', {}).get('name', '').split('/')[-1]
-            if not file_id:
-                return
+        Returns:
+            Dict[str, Dict]: 文件 ID -> 元数据，获取失败的文件不包含在结果中
+        """
+        results: Dict[str, Dict] = {}
+        
+        def callback(request_id, response, exception):
+            if exception is not None:
+                logger.warning(f"获取文件元数据失败 {request_id}: {exception}")
+            else:
+                results[request_id] = response
+        
+        # 去重后按单次批量请求的上限分组
+        ids = list(dict.fromkeys(ids))
+        for i in range(0, len(ids), self.BATCH_REQUEST_SIZE):
+            batch = self.service.new_batch_http_request(callback=callback)
+            for file_id in ids[i:i + self.BATCH_REQUEST_SIZE]:
+                batch.add(self.service.files().get(fileId=file_id, fields=fields),
+                          request_id=file_id)
+            batch.execute()
+        
+        return results
+    
+    def _fetch_files(self, file_ids: List[str]) -> Dict[str, Dict]:
+        """批量获取文件元数据
+        
+        Args:
+            file_ids: 文件 ID 列表
+            
+        Returns:
+            Dict[str, Dict]: 文件 ID -> 元数据
+        """
+        if not file_ids:
+            return {}
+        try:
+            return self._batch_get(file_ids, 'id, name, mimeType, size, modifiedTime, parents')
+        except Exception as e:
+            logger.error(f"批量获取文件元数据失败: {e}")
+            return {}
+    
+    def _prefetch_folders(self, files):
+        """逐层批量获取文件的上级文件夹并写入缓存
+        
+        每一层的所有未缓存文件夹合并为一次批量请求，之后解析路径时直接命中缓存。
+        
+        Args:
+            files: 文件元数据集合
+        """
+        try:
+            pending = list(files)
+            while pending:
+                missing = {
+                    item['parents'][0] for item in pending
+                    if item.get('parents') and item['id'] != self.folder_id
+                    and item['parents'][0] not in self._folder_cache
+                }
+                if not missing:
+                    return
+                
+                folders = self._batch_get(list(missing), 'id, name, parents')
+                for folder_id, folder in folders.items():
+                    self._folder_cache[folder_id] = folder
+                while len(self._folder_cache) > self.FOLDER_CACHE_SIZE:
+                    self._folder_cache.popitem(last=False)
+                pending = list(folders.values())
+                
+        except Exception as e:
+            # 预取失败不影响处理，解析路径时会逐个获取
+            logger.warning(f"批量获取文件夹信息失败: {e}")
+    
+    @staticmethod
+    def _parse_modified_time(value: str) -> int:
+        """解析 Drive API 返回的 RFC 3339 UTC 时间
+        
+        Args:
+            value: 时间字符串，如 2024-01-01T00:00:00.000Z
             
-            # 获取文件元数据
-            file = self.service.files().get(
-                fileId=file_id,
-                fields='id, name, mimeType, size, modifiedTime, parents'
-            ).execute()
+        Returns:
+            int: Unix 时间戳
+        """
+        # 去掉末尾的 Z 后按 UTC 解析，比 strptime 快且不受本地时区影响
+        return int(datetime.fromisoformat(value[:-1]).replace(tzinfo=timezone.utc).timestamp())
+    
+    def _process_activity(self, activity: Dict, file: Optional[Dict] = None):
+        """处理文件活动
+        
+        Args:
+            activity: 文件活动信息
+            file: 已获取的文件元数据，为 None 时单独请求
+        """
+        try:
+            if file is None:
+                # 获取文件信息
+                file_id = self._get_activity_file_id(activity)
+                if not file_id:
+                    return
+                
+                # 获取文件元数据
+                file = self.service.files().get(
+                    fileId=file_id,
+                    fields='id, name, mimeType, size, modifiedTime, parents'
+                ).execute()
             
             # 构建文件路径
             path = self._get_file_path(file)
@@ -191,20 +324,16 @@ class GoogleDriveAPI:
             is_new = self.db.add_file(
                 path=path,
                 size=int(file.get('size', 0)),
-                modified_time=int(datetime.strptime(
-                    file['modifiedTime'], '%Y-%m-%dT%H:%M:%S.%fZ'
-                ).timestamp()),
+                modified_time=self._parse_modified_time(file['modifiedTime']),
                 is_directory=file['mimeType'] == 'application/vnd.google-apps.folder',
-                parent_path=str(Path(path).parent),
+                parent_path=path.rpartition(os.sep)[0],
                 drive_id=file['id']
             )
             
             if is_new:
                 # 添加到任务队列
-                from .symlink_manager import SymlinkManager
-                symlink_mgr = SymlinkManager()
                 self.task_queue.add_task(
-                    symlink_mgr.process_file,
+                    self.symlink_mgr.process_file,
                     path,
                     priority=3  # Google Drive 变化优先级中等
                 )
@@ -213,6 +342,33 @@ class GoogleDriveAPI:
         except Exception as e:
             logger.error(f"处理文件活动失败: {e}")
     
+    def _get_folder(self, folder_id: str) -> Dict:
+        """获取文件夹元数据，优先使用缓存
+        
+        文件夹的名称和父目录很少变化，缓存后同一目录下的文件只需查询一次。
+        
+        Args:
+            folder_id: 文件夹 ID
+            
+        Returns:
+            Dict: 包含 id、name、parents 的文件夹信息
+        """
+        cache = self._folder_cache
+        folder = cache.get(folder_id)
+        if folder is not None:
+            cache.move_to_end(folder_id)
+            return folder
+        
+        folder = self.service.files().get(
+            fileId=folder_id,
+            fields='id, name, parents'
+        ).execute()
+        
+        cache[folder_id] = folder
+        if len(cache) > self.FOLDER_CACHE_SIZE:
+            cache.popitem(last=False)
+        return folder
+    
     def _get_file_path(self, file: Dict) -> Optional[str]:
         """获取文件在本地的路径
         
@@ -238,17 +394,14 @@ class GoogleDriveAPI:
                 if 'parents' not in current:
                     break
                     
-                parent_id = current['parents'][0]
-                current = self.service.files().get(
-                    fileId=parent_id,
-                    fields='id, name, parents'
-                ).execute()
+                current = self._get_folder(current['parents'][0])
             
             # 如果没有找到目标文件夹，返回 None
             if not path_parts:
                 return None
             
             # 构建本地路径
+            config_manager = get_config_manager()
             mount_point = config_manager.get('local_monitor.mount_point')
             path = os.path.join(mount_point, *reversed(path_parts))
             
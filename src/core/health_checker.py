@@ -10,25 +10,36 @@
 """
 
 import os
-import time
+import random
 import psutil
 import logging
 import requests
 import sqlite3
 from typing import Dict, List
 from pathlib import Path
-from threading import Thread, Event
+from threading import Thread, Event, Lock
+from concurrent.futures import ThreadPoolExecutor
 
-from .config_manager import config_manager
+from .config_manager import get_config_manager
 
 logger = logging.getLogger(__name__)
 
 class HealthChecker:
     """健康检查器"""
     
+    # 检查出错后重试的最长等待时间（秒）
+    MAX_ERROR_BACKOFF = 300
+    
+    # 挂载点写入测试的执行间隔（检查次数）
+    WRITE_PROBE_EVERY = 60
+    
+    # 并行执行检查的线程数，与检查项数量一致
+    CHECK_WORKERS = 5
+    
     def __init__(self):
         """初始化健康检查器"""
         # 获取配置
+        config_manager = get_config_manager()
         self.check_interval = config_manager.get('health_check.interval')
         self.timeout = config_manager.get('health_check.timeout')
         self.disk_threshold = config_manager.get('health_check.disk_usage_threshold')
@@ -41,12 +52,26 @@ class HealthChecker:
         self.emby_url = config_manager.get('emby.server_url')
         self.emby_api_key = config_manager.get('emby.api_key')
         
+        # 复用到 Emby 的 HTTP 连接和请求头，避免每次检查重新握手
+        self._emby_session = requests.Session()
+        self._emby_session.headers.update({
+            'X-Emby-Token': self.emby_api_key,
+            'Content-Type': 'application/json'
+        })
+        
+        # 挂载点写入测试计数，检查可能在多个线程中同时执行，读写需持有锁
+        self._write_probe_count = 0
+        self._write_probe_lock = Lock()
+        
+        # 长期复用的检查线程池，检查循环和 API 请求共用
+        self._pool = ThreadPoolExecutor(max_workers=self.CHECK_WORKERS,
+                                        thread_name_prefix='health-check')
+        
         # 初始化停止事件
         self.stop_event = Event()
         
         # 初始化检查线程
-        self.check_thread = Thread(target=self._check_loop)
-        self.check_thread.daemon = True
+        self.check_thread = Thread(target=self._check_loop, daemon=True)
     
     def start(self):
         """启动健康检查"""
@@ -69,12 +94,17 @@ class HealthChecker:
                 self.check_thread.join()
                 logger.info("停止健康检查")
             
+            # 关闭检查线程池并释放 HTTP 连接
+            self._pool.shutdown(wait=True)
+            self._emby_session.close()
+            
         except Exception as e:
             logger.error(f"停止健康检查失败: {e}")
             raise
     
     def _check_loop(self):
         """健康检查循环"""
+        failures = 0
         while not self.stop_event.is_set():
             try:
                 # 执行所有检查
@@ -88,12 +118,15 @@ class HealthChecker:
                         logger.warning(f"{component} 检查失败: {result['message']}")
                 
                 # 等待下次检查
+                failures = 0
                 self.stop_event.wait(self.check_interval)
                 
             except Exception as e:
                 logger.error(f"执行健康检查失败: {e}")
-                # 出错后等待一段时间再重试
-                time.sleep(min(self.check_interval, 60))
+                # 出错后按指数退避加随机抖动等待，连续失败时逐步拉长间隔
+                delay = min(min(self.check_interval, 60) * 2 ** failures, self.MAX_ERROR_BACKOFF)
+                failures += 1
+                self.stop_event.wait(delay * random.uniform(0.8, 1.2))
     
     def check_all(self) -> Dict[str, Dict]:
         """执行所有健康检查
@@ -101,13 +134,17 @@ class HealthChecker:
         Returns:
             Dict[str, Dict]: 检查结果字典
         """
-        return {
-            'google_drive': self.check_google_drive(),
-            'rclone_mount': self.check_rclone_mount(),
-            'database': self.check_database(),
-            'emby': self.check_emby(),
-            'system': self.check_system_resources()
+        checks = {
+            'google_drive': self.check_google_drive,
+            'rclone_mount': self.check_rclone_mount,
+            'database': self.check_database,
+            'emby': self.check_emby,
+            'system': self.check_system_resources
         }
+        
+        # 各项检查互不依赖，并行执行，总耗时取决于最慢的一项
+        futures = {name: self._pool.submit(check) for name, check in checks.items()}
+        return {name: future.result() for name, future in futures.items()}
     
     def is_healthy(self) -> bool:
         """检查系统是否健康
@@ -151,18 +188,45 @@ class HealthChecker:
                     'message': f'挂载点不存在: {self.mount_point}'
                 }
             
-            # 检查挂载点是否可写
-            test_file = os.path.join(self.mount_point, '.health_check')
-            try:
-                with open(test_file, 'w') as f:
-                    f.write('test')
-                os.remove(test_file)
-            except Exception as e:
+            # 挂载断开时目录仍然存在，需要确认是挂载点
+            if not os.path.ismount(self.mount_point):
                 return {
                     'status': False,
-                    'message': f'挂载点不可写: {e}'
+                    'message': f'挂载点未挂载: {self.mount_point}'
                 }
             
+            # 通过 statvfs 和权限检查判断可用性，不产生实际读写
+            st = os.statvfs(self.mount_point)
+            if st.f_bavail == 0:
+                return {
+                    'status': False,
+                    'message': '挂载点可用空间不足'
+                }
+            if not os.access(self.mount_point, os.W_OK):
+                return {
+                    'status': False,
+                    'message': '挂载点不可写'
+                }
+            
+            # 写入测试会产生远端上传，每隔若干次检查才执行一次
+            with self._write_probe_lock:
+                probe = self._write_probe_count % self.WRITE_PROBE_EVERY == 0
+                self._write_probe_count += 1
+            if probe:
+                test_file = os.path.join(self.mount_point, '.health_check')
+                try:
+                    with open(test_file, 'w') as f:
+                        f.write('test')
+                    os.remove(test_file)
+                except Exception as e:
+                    # 写入失败后下次检查继续测试
+                    with self._write_probe_lock:
+                        self._write_probe_count = 0
+                    return {
+                        'status': False,
+                        'message': f'挂载点不可写: {e}'
+                    }
+            
             return {
                 'status': True,
                 'message': '挂载点状态正常'
@@ -220,14 +284,8 @@ class HealthChecker:
                 }
             
             # 测试 API 连接
-            headers = {
-                'X-Emby-Token': self.emby_api_key,
-                'Content-Type': 'application/json'
-            }
-            
-            response = requests.get(
+            response = self._emby_session.get(
                 f"{self.emby_url}/emby/System/Info",
-                headers=headers,
                 timeout=self.timeout
             )
             response.raise_for_status()
@@ -11,48 +11,76 @@
 import os
 import time
 import logging
-from typing import Dict, List, Set, Generator
-from pathlib import Path
-from threading import Lock
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Set, Generator, Tuple
+from threading import Lock, get_ident
 
-from .config_manager import config_manager
-from .db_manager import DatabaseManager
+from .config_manager import get_config_manager
+from .db_manager import get_db_manager
+from .symlink_manager import in_bdmv_dir
 
 logger = logging.getLogger(__name__)
 
+class ScanInProgressError(RuntimeError):
+    """已有全量扫描正在执行"""
+
 class Initializer:
     """初始化器"""
     
     # 支持的视频文件格式
-    VIDEO_EXTENSIONS = {
+    VIDEO_EXTENSIONS = frozenset({
         '.mp4', '.mkv', '.ts', '.iso', '.rmvb', '.avi',
         '.mov', '.mpeg', '.mpg', '.wmv', '.3gp', '.asf',
         '.m4v', '.flv', '.m2ts', '.strm', '.tp', '.f4v'
-    }
+    })
+    
+    # 全量扫描时每批写入数据库的记录数
+    SCAN_BATCH_SIZE = 1000
+    
+    # 并发创建软链接的线程数
+    SYMLINK_WORKERS = 16
     
     def __init__(self):
         """初始化初始化器"""
         # 获取配置
-        self.mount_point = config_manager.get('local_monitor.mount_point')
-        self.target_base = config_manager.get('symlink.target_base')
-        self.log_path = config_manager.get('logging.path')
-        self.overwrite_existing = config_manager.get('symlink.overwrite_existing')
+        self._load_config()
         
         # 初始化数据库管理器
-        self.db = DatabaseManager()
+        self.db = get_db_manager()
         
-        # 初始化锁
+        # 扫描锁，同一时间只允许一次全量扫描
         self.lock = Lock()
     
+    def _load_config(self):
+        """读取扫描相关配置
+        
+        实例长期存在，每次扫描前重新读取，使配置修改在下次扫描时生效。
+        """
+        config_manager = get_config_manager()
+        self.mount_point = config_manager.get('local_monitor.mount_point')
+        self.target_base = config_manager.get('symlink.target_base')
+        self.log_path = config_manager.get('logging.path')
+        self.overwrite_existing = config_manager.get('symlink.overwrite_existing')
+    
     def initialize(self) -> bool:
         """执行初始化
         
         Returns:
             bool: 是否初始化成功
+            
+        Raises:
+            ScanInProgressError: 已有扫描正在执行
         """
+        if not self.lock.acquire(blocking=False):
+            raise ScanInProgressError("全量扫描正在进行中")
+        
         try:
             logger.info("开始系统初始化")
             
+            # 读取最新配置
+            self._load_config()
+            
             # 创建必要的目录
             self._create_directories()
             
@@ -71,6 +99,9 @@ class Initializer:
         except Exception as e:
             logger.error(f"系统初始化失败: {e}")
             return False
+        
+        finally:
+            self.lock.release()
     
     def _create_directories(self):
         """创建必要的目录结构"""
@@ -97,29 +128,28 @@ class Initializer:
             logger.info(f"开始扫描目录: {self.mount_point}")
             start_time = time.time()
             
-            # 遍历目录树
+            # 遍历目录树，直接使用遍历时取得的 stat 结果，分批写入数据库
+            batch = []
             for entry in self._walk_directory(self.mount_point):
                 path = entry['path']
+                st = entry['stat']
                 is_directory = entry['is_directory']
                 
-                if is_directory:
-                    # 记录目录
-                    self.db.add_file(
-                        path=path,
-                        size=0,
-                        modified_time=int(os.path.getmtime(path)),
-                        is_directory=True,
-                        parent_path=str(Path(path).parent)
-                    )
-                else:
-                    # 记录文件
-                    self.db.add_file(
-                        path=path,
-                        size=os.path.getsize(path),
-                        modified_time=int(os.path.getmtime(path)),
-                        is_directory=False,
-                        parent_path=str(Path(path).parent)
-                    )
+                # 记录目录或文件: (path, size, modified_time, is_directory, parent_path, drive_id)
+                batch.append((
+                    path,
+                    0 if is_directory else st.st_size,
+                    int(st.st_mtime),
+                    is_directory,
+                    os.path.dirname(path),
+                    None
+                ))
+                if len(batch) >= self.SCAN_BATCH_SIZE:
+                    self.db.add_files(batch)
+                    batch = []
+            
+            if batch:
+                self.db.add_files(batch)
             
             duration = time.time() - start_time
             logger.info(f"目录扫描完成，耗时 {duration:.2f} 秒")
@@ -131,33 +161,41 @@ class Initializer:
     def _walk_directory(self, directory: str) -> Generator[Dict, None, None]:
         """遍历目录树
         
+        使用 os.scandir 遍历，复用 DirEntry 的类型信息和 stat 结果，
+        避免对每个条目重复调用 stat。与 os.walk 一致，不进入指向目录的软链接。
+        
         Args:
             directory: 目录路径
             
         Yields:
-            Dict: 包含文件信息的字典
+            Dict: 包含 path、is_directory 和 stat 的文件信息字典
         """
-        try:
-            for root, dirs, files in os.walk(directory):
-                # 记录目录
-                for dir_name in dirs:
-                    path = os.path.join(root, dir_name)
-                    yield {
-                        'path': path,
-                        'is_directory': True
-                    }
+        pending = [directory]
+        while pending:
+            current = pending.pop()
+            try:
+                with os.scandir(current) as it:
+                    entries = list(it)
+            except OSError as e:
+                logger.warning(f"遍历目录失败 {current}: {e}")
+                continue
+            
+            for entry in entries:
+                try:
+                    is_directory = entry.is_dir()
+                    st = entry.stat()
+                except OSError as e:
+                    logger.warning(f"读取文件信息失败 {entry.path}: {e}")
+                    continue
                 
-                # 记录文件
-                for file_name in files:
-                    path = os.path.join(root, file_name)
-                    yield {
-                        'path': path,
-                        'is_directory': False
-                    }
-                    
-        except Exception as e:
-            logger.error(f"遍历目录失败 {directory}: {e}")
-            raise
+                if is_directory and not entry.is_symlink():
+                    pending.append(entry.path)
+                
+                yield {
+                    'path': entry.path,
+                    'is_directory': is_directory,
+                    'stat': st
+                }
     
     def _is_video_file(self, path: str) -> bool:
         """检查是否是视频文件
@@ -168,7 +206,9 @@ class Initializer:
         Returns:
             bool: 是否是视频文件
         """
-        return Path(path).suffix.lower() in self.VIDEO_EXTENSIONS
+        # 直接截取扩展名，避免为每个文件构造 Path 对象
+        i = path.rfind('.')
+        return i != -1 and path[i:].lower() in self.VIDEO_EXTENSIONS
     
     def _should_process(self, path: str) -> bool:
         """检查是否应该处理该文件
@@ -179,15 +219,8 @@ class Initializer:
         Returns:
             bool: 是否应该处理
         """
-        # 检查是否是视频文件
-        if not self._is_video_file(path):
-            return False
-        
-        # 检查是否在 BDMV 目录中
-        if "BDMV" in Path(path).parts:
-            return False
-        
-        return True
+        # 先按扩展名过滤，BDMV 目录判断与软链接管理器共用同一实现
+        return self._is_video_file(path) and not in_bdmv_dir(path)
     
     def _create_symlinks_from_db(self):
         """从数据库创建软链接"""
@@ -195,14 +228,13 @@ class Initializer:
             logger.info("开始创建软链接")
             start_time = time.time()
             
-            # 获取所有非目录文件
-            files = self.db.list_files(is_directory=False)
-            
-            # 创建软链接
-            created_count = 0
-            skipped_count = 0
+            # 挂载点下的文件直接截取前缀得到相对路径，不必每次调用 relpath
+            mount_prefix = os.path.join(self.mount_point, '')
+            prefix_len = len(mount_prefix)
             
-            for file in files:
+            # 获取所有非目录文件，构建 (源路径, 目标路径) 列表
+            pairs = []
+            for file in self.db.iter_files(is_directory=False):
                 path = file['path']
                 
                 # 检查是否应该处理
@@ -210,31 +242,62 @@ class Initializer:
                     continue
                 
                 # 构建目标路径
-                rel_path = os.path.relpath(path, self.mount_point)
-                target_path = os.path.join(self.target_base, rel_path)
-                target_dir = os.path.dirname(target_path)
-                
+                if path.startswith(mount_prefix):
+                    rel_path = path[prefix_len:]
+                else:
+                    rel_path = os.path.relpath(path, self.mount_point)
+                pairs.append((path, os.path.join(self.target_base, rel_path)))
+            
+            # 预先创建所有目标目录，每个目录只创建一次
+            for target_dir in sorted({os.path.dirname(target) for _, target in pairs}, key=len):
                 try:
-                    # 确保目标目录存在
                     os.makedirs(target_dir, exist_ok=True)
-                    
-                    # 检查目标是否已存在
-                    if os.path.exists(target_path):
-                        if not self.overwrite_existing:
-                            skipped_count += 1
-                            continue
-                        os.remove(target_path)
-                    
-                    # 创建软链接
-                    os.symlink(path, target_path)
-                    created_count += 1
-                    
-                except Exception as e:
-                    logger.error(f"创建软链接失败 {path}: {e}")
+                except OSError as e:
+                    logger.error(f"创建目标目录失败 {target_dir}: {e}")
+            
+            # 软链接创建以系统调用为主，使用线程池并发执行
+            with ThreadPoolExecutor(max_workers=self.SYMLINK_WORKERS,
+                                    thread_name_prefix='symlink') as executor:
+                counts = Counter(executor.map(self._make_one_symlink, pairs))
+            created_count = counts['created']
+            skipped_count = counts['skipped']
             
             duration = time.time() - start_time
             logger.info(f"软链接创建完成，创建 {created_count} 个，跳过 {skipped_count} 个，耗时 {duration:.2f} 秒")
             
         except Exception as e:
             logger.error(f"从数据库创建软链接失败: {e}")
-            raise 
\ No newline at end of file
+            raise
+    
+    def _make_one_symlink(self, pair: Tuple[str, str]) -> str:
+        """创建单个软链接
+        
+        Args:
+            pair: (源文件路径, 软链接路径)
+            
+        Returns:
+            str: 处理结果，created、skipped 或 failed
+        """
+        path, target_path = pair
+        try:
+            # 目标目录已由调用方预先创建，直接创建软链接，已存在时再处理
+            try:
+                os.symlink(path, target_path)
+                return 'created'
+            except FileExistsError:
+                if not self.overwrite_existing:
+                    return 'skipped'
+            
+            # 在同一目录下创建临时链接后原子替换，不存在删除与创建之间的空窗
+            tmp_path = f"{target_path}.{os.getpid()}.{get_ident()}.tmp"
+            os.symlink(path, tmp_path)
+            try:
+                os.replace(tmp_path, target_path)
+            except OSError:
+                os.remove(tmp_path)
+                raise
+            return 'created'
+            
+        except Exception as e:
+            logger.error(f"创建软链接失败 {path}: {e}")
+            return 'failed' 
\ No newline at end of file
@@ -9,21 +9,79 @@
 """
 
 import os
+import re
 import time
+import hashlib
 import logging
-from typing import Dict, Set
-from pathlib import Path
-from threading import Thread, Event, Lock
-from queue import Queue
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from threading import Thread, Event, Lock, Condition
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler, FileSystemEvent
 
-from .config_manager import config_manager
-from .db_manager import DatabaseManager
+from .config_manager import get_config_manager
+from .db_manager import get_db_manager
 from .task_queue import TaskQueue
+from .symlink_manager import SymlinkManager
 
 logger = logging.getLogger(__name__)
 
+
+def _glob_to_regex(pattern: str) -> str:
+    """将单条 glob 模式转换为正则表达式
+    
+    与 PurePath.match 语义一致：通配符不跨越路径分隔符，
+    相对模式从路径末尾开始匹配，绝对模式匹配完整路径。
+    
+    Args:
+        pattern: glob 模式
+        
+    Returns:
+        str: 正则表达式
+    """
+    parts = []
+    i, n = 0, len(pattern)
+    while i < n:
+        c = pattern[i]
+        i += 1
+        if c == '*':
+            parts.append('[^/]*')
+        elif c == '?':
+            parts.append('[^/]')
+        elif c == '[':
+            j = pattern.find(']', i + 1 if i < n and pattern[i] in '!]' else i)
+            if j == -1:
+                parts.append(re.escape(c))
+            else:
+                body = pattern[i:j].replace('\\', '\\\\')
+                if body.startswith('!'):
+                    body = '^' + body[1:]
+                parts.append(f'[{body}]')
+                i = j + 1
+        else:
+            parts.append(re.escape(c))
+    
+    body = ''.join(parts)
+    if pattern.startswith('/'):
+        return f'^{body}\\Z'
+    return f'(?:^|/){body}\\Z'
+
+
+def _compile_ignore_patterns(patterns: Optional[List[str]]) -> Optional[re.Pattern]:
+    """将忽略模式合并编译为单个正则表达式
+    
+    Args:
+        patterns: glob 模式列表
+        
+    Returns:
+        Optional[re.Pattern]: 合并后的正则表达式，没有模式时返回 None
+    """
+    if not patterns:
+        return None
+    return re.compile('|'.join(f'(?:{_glob_to_regex(p)})' for p in patterns))
+
+
 class FileEventHandler(FileSystemEventHandler):
     """文件事件处理器"""
     
@@ -34,8 +92,6 @@ class FileEventHandler(FileSystemEventHandler):
             monitor: LocalMonitor 实例
         """
         self.monitor = monitor
-        self.processing_lock = Lock()
-        self.processing_paths = set()
     
     def on_created(self, event: FileSystemEvent):
         """处理文件创建事件"""
@@ -59,41 +115,64 @@ class FileEventHandler(FileSystemEventHandler):
             path: 文件路径
             event_type: 事件类型
         """
-        with self.processing_lock:
-            # 检查是否已在处理中
-            if path in self.processing_paths:
-                return
-            self.processing_paths.add(path)
-        
-        try:
-            # 将事件添加到队列
-            self.monitor.event_queue.put((path, event_type))
-            logger.debug(f"添加事件到队列: {event_type} {path}")
-            
-        finally:
-            with self.processing_lock:
-                self.processing_paths.remove(path)
+        monitor = self.monitor
+        with monitor.event_cond:
+            # 同一路径的待处理事件合并，后到的事件覆盖先到的，
+            # 但新建文件随后的修改仍按新建处理
+            pending = monitor.pending_events
+            if not (event_type == 'modified' and pending.get(path) == 'created'):
+                pending[path] = event_type
+            monitor.event_cond.notify()
+        logger.debug(f"添加事件到队列: {event_type} {path}")
 
 class LocalMonitor:
     """本地目录监控器"""
     
+    # 轮询扫描的并发线程数
+    SCAN_WORKERS = 8
+    
+    # 轮询扫描时每批写入数据库的记录数
+    SCAN_BATCH_SIZE = 1000
+    
+    # 内容比较时读取文件首尾的字节数
+    CONTENT_SAMPLE_SIZE = 65536
+    
+    # 文件指纹缓存的最大条目数
+    PATH_CACHE_SIZE = 200000
+    
+    # 待处理事件达到该数量时不再等待，立即处理
+    EVENT_BATCH_SIZE = 256
+    
+    # 事件不足一批时最多等待的时间（秒），用于合并突发事件
+    EVENT_BATCH_WAIT = 0.1
+    
+    # 汇总通知 Emby 刷新的间隔（秒），独立于轮询，关闭轮询时同样生效
+    NOTIFY_INTERVAL = 10
+    
     def __init__(self):
         """初始化本地目录监控器"""
         # 获取配置
+        config_manager = get_config_manager()
         self.mount_point = config_manager.get('local_monitor.mount_point')
         self.polling_interval = config_manager.get('local_monitor.polling_interval')
         self.watch_patterns = config_manager.get('local_monitor.watch_patterns')
         self.ignore_patterns = config_manager.get('local_monitor.ignore_patterns')
+        self._ignore_re = _compile_ignore_patterns(self.ignore_patterns)
+        self.polling_mode = config_manager.get('local_monitor.polling_mode', 'always')
+        self.compare_contents = bool(config_manager.get('local_monitor.compare_contents', False))
         
         # 确保监控目录存在
         os.makedirs(self.mount_point, exist_ok=True)
         
         # 初始化组件
-        self.db = DatabaseManager()
+        self.db = get_db_manager()
         self.task_queue = TaskQueue()
+        self.symlink_mgr = SymlinkManager()
+        self.video_extensions = self.symlink_mgr.video_extensions
         
         # 初始化事件队列和处理线程
-        self.event_queue = Queue()
+        self.pending_events: Dict[str, str] = {}  # path -> 最新事件类型
+        self.event_cond = Condition()
         self.stop_event = Event()
         self.processing_thread = Thread(target=self._process_events)
         
@@ -105,9 +184,12 @@ class LocalMonitor:
         # 初始化轮询线程
         self.polling_thread = Thread(target=self._poll_changes)
         
+        # 初始化 Emby 通知线程
+        self.notify_thread = Thread(target=self._notify_changes)
+        
         # 初始化缓存
         self.cache_lock = Lock()
-        self.path_cache = {}  # 缓存文件信息
+        self.path_cache = OrderedDict()  # 缓存文件指纹 (size, mtime_ns, digest)，按访问顺序淘汰
         self.last_check = {}  # 记录最后检查时间
     
     def start(self):
@@ -122,8 +204,14 @@ class LocalMonitor:
             logger.info("启动事件处理线程")
             
             # 启动轮询线程
-            self.polling_thread.start()
-            logger.info(f"启动轮询线程，间隔 {self.polling_interval} 秒")
+            if self.polling_mode == 'off':
+                logger.info("轮询已关闭，仅依赖文件系统事件")
+            else:
+                self.polling_thread.start()
+                logger.info(f"启动轮询线程，模式 {self.polling_mode}，间隔 {self.polling_interval} 秒")
+            
+            # 启动 Emby 通知线程
+            self.notify_thread.start()
             
         except Exception as e:
             logger.error(f"启动监控失败: {e}")
@@ -144,7 +232,8 @@ class LocalMonitor:
             
             # 停止处理线程
             if self.processing_thread.is_alive():
-                self.event_queue.put(None)  # 发送停止信号
+                with self.event_cond:
+                    self.event_cond.notify_all()  # 唤醒处理线程以检查停止标志
                 self.processing_thread.join()
                 logger.info("停止事件处理线程")
             
@@ -153,70 +242,107 @@ class LocalMonitor:
                 self.polling_thread.join()
                 logger.info("停止轮询线程")
             
+            # 停止 Emby 通知线程
+            if self.notify_thread.is_alive():
+                self.notify_thread.join()
+                logger.info("停止 Emby 通知线程")
+            
+            # 释放软链接管理器持有的 Emby 连接
+            self.symlink_mgr.close()
+            
         except Exception as e:
             logger.error(f"停止监控失败: {e}")
             raise
     
     def _process_events(self):
-        """处理事件队列"""
+        """处理事件队列
+        
+        每次整体取走待处理事件，数据库更新在单个事务中完成。
+        """
         while not self.stop_event.is_set():
             try:
-                # 从队列获取事件
-                event = self.event_queue.get()
-                if event is None:  # 停止信号
-                    break
-                
-                path, event_type = event
-                
-                # 处理事件
-                if event_type == 'deleted':
-                    self.db.delete_file(path)
-                    logger.info(f"删除文件记录: {path}")
-                else:
-                    # 获取文件信息
-                    try:
-                        stat = os.stat(path)
-                        size = stat.st_size
-                        modified_time = int(stat.st_mtime)
-                        
-                        # 更新数据库
-                        is_new = self.db.add_file(
-                            path=path,
-                            size=size,
-                            modified_time=modified_time,
-                            is_directory=False,
-                            parent_path=str(Path(path).parent)
+                with self.event_cond:
+                    # 等待事件到达
+                    while not self.pending_events and not self.stop_event.is_set():
+                        self.event_cond.wait()
+                    
+                    # 突发事件短暂等待，合并同一路径的重复事件
+                    if len(self.pending_events) < self.EVENT_BATCH_SIZE:
+                        self.event_cond.wait_for(
+                            lambda: (len(self.pending_events) >= self.EVENT_BATCH_SIZE
+                                     or self.stop_event.is_set()),
+                            timeout=self.EVENT_BATCH_WAIT
                         )
-                        
-                        if is_new:
-                            # 添加到任务队列
-                            from .symlink_manager import SymlinkManager
-                            symlink_mgr = SymlinkManager()
-                            self.task_queue.add_task(
-                                symlink_mgr.process_file,
-                                path,
-                                priority=1 if event_type == 'created' else 2
-                            )
-                            logger.info(f"添加处理任务: {event_type} {path}")
-                            
-                    except FileNotFoundError:
-                        logger.warning(f"文件不存在: {path}")
-                    except Exception as e:
-                        logger.error(f"处理文件失败 {path}: {e}")
+                    if self.stop_event.is_set():
+                        break
+                    
+                    batch, self.pending_events = self.pending_events, {}
+                
+                self._handle_events(batch.items())
                 
             except Exception as e:
                 logger.error(f"处理事件失败: {e}")
+    
+    def _handle_events(self, batch: Iterable[Tuple[str, str]]):
+        """处理一批文件事件
+        
+        Args:
+            batch: (文件路径, 事件类型) 序列
+        """
+        rows = []
+        priorities = {}
+        
+        for path, event_type in batch:
+            # 处理事件
+            if event_type == 'deleted':
+                with self.cache_lock:
+                    self.path_cache.pop(path, None)
+                self.db.delete_file(path)
+                logger.info(f"删除文件记录: {path}")
+                continue
             
-            finally:
-                self.event_queue.task_done()
+            # 获取文件信息，事件意味着文件刚被写入，必须重新 stat 取得最新大小和修改时间
+            try:
+                stat = os.stat(path)
+                rows.append((
+                    path,
+                    stat.st_size,
+                    int(stat.st_mtime),
+                    False,
+                    path.rpartition(os.sep)[0],
+                    None
+                ))
+                priorities[path] = (1 if event_type == 'created' else 2, event_type)
+                
+            except FileNotFoundError:
+                logger.warning(f"文件不存在: {path}")
+            except Exception as e:
+                logger.error(f"处理文件失败 {path}: {e}")
+        
+        # 批量更新数据库，只为新增或变化的文件添加任务
+        for path in self.db.upsert_files(rows):
+            priority, event_type = priorities[path]
+            try:
+                self.task_queue.add_task(
+                    self.symlink_mgr.process_file,
+                    path,
+                    priority=priority
+                )
+                logger.info(f"添加处理任务: {event_type} {path}")
+            except Exception as e:
+                logger.error(f"处理文件失败 {path}: {e}")
     
     def _poll_changes(self):
         """轮询检查文件变化"""
         while not self.stop_event.is_set():
             try:
-                # 扫描目录
-                self._scan_directory(self.mount_point)
-                logger.debug(f"完成目录扫描: {self.mount_point}")
+                # fallback 模式下文件系统监控正常时跳过扫描
+                if self.polling_mode == 'fallback' and self.observer.is_alive():
+                    logger.debug("文件系统监控正常，跳过轮询扫描")
+                else:
+                    # 扫描目录
+                    self._scan_directory(self.mount_point)
+                    logger.debug(f"完成目录扫描: {self.mount_point}")
                 
                 # 等待下次轮询
                 self.stop_event.wait(self.polling_interval)
@@ -226,64 +352,41 @@ class LocalMonitor:
                 # 出错后等待一段时间再重试
                 time.sleep(min(self.polling_interval, 60))
     
+    def _notify_changes(self):
+        """定期汇总新建的软链接通知 Emby 刷新
+        
+        软链接由事件处理和轮询扫描共同产生，通知不依赖轮询线程，
+        停止时再发送一次，避免遗留待刷新路径。
+        """
+        while not self.stop_event.wait(self.NOTIFY_INTERVAL):
+            try:
+                self.symlink_mgr.notify_emby()
+            except Exception as e:
+                logger.error(f"通知 Emby 刷新失败: {e}")
+        
+        try:
+            self.symlink_mgr.notify_emby()
+        except Exception as e:
+            logger.error(f"通知 Emby 刷新失败: {e}")
+    
     def _scan_directory(self, directory: str):
         """扫描目录
         
+        子目录作为独立任务分发到线程池并发遍历，目录枚举受系统调用延迟限制，
+        多线程可以有效缩短大目录树的扫描时间。
+        
         Args:
             directory: 目录路径
         """
         try:
-            # 获取目录下的所有文件
-            for root, _, files in os.walk(directory):
-                for filename in files:
-                    path = os.path.join(root, filename)
-                    
-                    try:
-                        # 检查是否需要跳过
-                        if any(Path(path).match(pattern) for pattern in self.ignore_patterns):
-                            continue
-                        
-                        # 获取文件信息
-                        stat = os.stat(path)
-                        size = stat.st_size
-                        modified_time = int(stat.st_mtime)
-                        
-                        # 检查缓存
-                        with self.cache_lock:
-                            cached = self.path_cache.get(path)
-                            if cached and cached['modified_time'] == modified_time:
-                                continue
-                            
-                            # 更新缓存
-                            self.path_cache[path] = {
-                                'size': size,
-                                'modified_time': modified_time
-                            }
-                        
-                        # 更新数据库
-                        is_new = self.db.add_file(
-                            path=path,
-                            size=size,
-                            modified_time=modified_time,
-                            is_directory=False,
-                            parent_path=str(Path(path).parent)
-                        )
-                        
-                        if is_new:
-                            # 添加到任务队列
-                            from .symlink_manager import SymlinkManager
-                            symlink_mgr = SymlinkManager()
-                            self.task_queue.add_task(
-                                symlink_mgr.process_file,
-                                path,
-                                priority=1  # 轮询发现的变化优先级较低
-                            )
-                            logger.info(f"添加处理任务: {path}")
-                        
-                    except FileNotFoundError:
-                        logger.warning(f"文件不存在: {path}")
-                    except Exception as e:
-                        logger.error(f"处理文件失败 {path}: {e}")
+            with ThreadPoolExecutor(max_workers=self.SCAN_WORKERS,
+                                    thread_name_prefix='scan') as pool:
+                pending = {pool.submit(self._scan_single_directory, directory)}
+                while pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        for subdir in future.result():
+                            pending.add(pool.submit(self._scan_single_directory, subdir))
             
             # 清理过期缓存
             self._cleanup_cache()
@@ -291,24 +394,158 @@ class LocalMonitor:
         except Exception as e:
             logger.error(f"扫描目录失败 {directory}: {e}")
     
-    def _cleanup_cache(self, max_age: int = 3600):
-        """清理过期缓存
+    def _scan_single_directory(self, current: str) -> List[str]:
+        """扫描单个目录（不递归）
+        
+        使用 os.scandir 遍历，目录项类型来自 readdir 无需额外 stat，
+        只对通过扩展名和忽略规则过滤的视频文件调用 stat。
         
         Args:
-            max_age: 最大缓存时间（秒）
+            current: 目录路径
+            
+        Returns:
+            List[str]: 待继续扫描的子目录列表
         """
+        subdirs = []
+        if self.stop_event.is_set():
+            return subdirs
+        
+        ignore_re = self._ignore_re
+        video_extensions = self.video_extensions
+        path_cache = self.path_cache
+        cache_lock = self.cache_lock
+        compare_contents = self.compare_contents
+        rows = []
+        content_changed = []
+        
         try:
-            current_time = time.time()
-            with self.cache_lock:
-                # 清理过期的缓存项
-                expired = [path for path, info in self.path_cache.items()
-                          if current_time - info.get('modified_time', 0) > max_age]
+            it = os.scandir(current)
+        except OSError as e:
+            logger.warning(f"无法读取目录 {current}: {e}")
+            return subdirs
+        
+        with it:
+            for entry in it:
+                path = entry.path
                 
-                for path in expired:
-                    del self.path_cache[path]
+                try:
+                    # 不跟随符号链接，避免循环
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(path)
+                        continue
+                    if not entry.is_file(follow_symlinks=False):
+                        continue
+                    
+                    # 只处理视频文件，其他文件无需 stat 和写入数据库
+                    name = entry.name
+                    i = name.rfind('.')
+                    if i == -1 or name[i:].lower() not in video_extensions:
+                        continue
+                    
+                    # 检查是否需要跳过
+                    if ignore_re is not None and ignore_re.search(path):
+                        continue
+                    
+                    # 获取文件信息
+                    stat = entry.stat(follow_symlinks=False)
+                    size = stat.st_size
+                    modified_time = int(stat.st_mtime)
+                    
+                    # 比较文件指纹，未变化时不访问数据库
+                    with cache_lock:
+                        cached = path_cache.get(path)
+                    
+                    digest = None
+                    if cached is not None and cached[:2] == (size, stat.st_mtime_ns):
+                        if not compare_contents:
+                            with cache_lock:
+                                path_cache.move_to_end(path)
+                            continue
+                        
+                        # 大小和修改时间都未变化时才读取内容摘要，
+                        # 首次计算只记录基准，摘要变化时直接添加任务
+                        digest = self._content_digest(path, size)
+                        if cached[2] is None or cached[2] == digest:
+                            with cache_lock:
+                                path_cache[path] = (size, stat.st_mtime_ns, digest)
+                                path_cache.move_to_end(path)
+                            continue
+                        content_changed.append(path)
+                    
+                    with cache_lock:
+                        path_cache[path] = (size, stat.st_mtime_ns, digest)
+                        path_cache.move_to_end(path)
+                    
+                    # 累积后批量更新数据库
+                    rows.append((path, size, modified_time, False, current, None))
+                    if len(rows) >= self.SCAN_BATCH_SIZE:
+                        self._flush_scan_rows(rows, content_changed)
+                        rows = []
+                        content_changed = []
+                    
+                except FileNotFoundError:
+                    logger.warning(f"文件不存在: {path}")
+                except Exception as e:
+                    logger.error(f"处理文件失败 {path}: {e}")
+        
+        self._flush_scan_rows(rows, content_changed)
+        return subdirs
+    
+    def _flush_scan_rows(self, rows: List[Tuple], content_changed: Iterable[str] = ()):
+        """批量写入扫描到的文件记录，并为新增或变化的文件添加任务
+        
+        Args:
+            rows: 文件记录列表
+            content_changed: 仅内容摘要变化的文件路径，数据库记录不变，需直接添加任务
+        """
+        changed = self.db.upsert_files(rows)
+        changed.extend(set(content_changed).difference(changed))
+        for path in changed:
+            # 添加到任务队列
+            self.task_queue.add_task(
+                self.symlink_mgr.process_file,
+                path,
+                priority=1  # 轮询发现的变化优先级较低
+            )
+            logger.info(f"添加处理任务: {path}")
+    
+    def _content_digest(self, path: str, size: int) -> bytes:
+        """计算文件首尾内容的摘要
+        
+        仅读取首尾各 CONTENT_SAMPLE_SIZE 字节，用于发现大小和修改时间
+        都未变化的内容替换（部分伪文件系统不更新 mtime）。
+        
+        Args:
+            path: 文件路径
+            size: 文件大小
+            
+        Returns:
+            bytes: 内容摘要
+        """
+        sample = self.CONTENT_SAMPLE_SIZE
+        digest = hashlib.blake2b(digest_size=16)
+        with open(path, 'rb') as f:
+            digest.update(f.read(sample))
+            if size > sample:
+                f.seek(max(size - sample, sample))
+                digest.update(f.read(sample))
+        return digest.digest()
+    
+    def _cleanup_cache(self):
+        """清理缓存
+        
+        文件指纹缓存超出容量时淘汰最久未访问的项，
+        已删除的文件在扫描中不再被访问，会最先被淘汰。
+        """
+        try:
+            with self.cache_lock:
+                # 淘汰最久未访问的缓存项
+                evicted = len(self.path_cache) - self.PATH_CACHE_SIZE
+                for _ in range(evicted):
+                    self.path_cache.popitem(last=False)
                 
-                if expired:
-                    logger.debug(f"清理 {len(expired)} 个过期缓存项")
+                if evicted > 0:
+                    logger.debug(f"清理 {evicted} 个缓存项")
                     
         except Exception as e:
             logger.error(f"清理缓存失败: {e}") 
\ No newline at end of file
@@ -9,12 +9,14 @@
 """
 
 import os
+import queue
+import atexit
 import logging
 import logging.handlers
 from pathlib import Path
 from typing import Optional, Union
 
-from .config_manager import config_manager
+from .config_manager import get_config_manager
 
 class LogManager:
     """日志管理器"""
@@ -22,6 +24,7 @@ class LogManager:
     def __init__(self):
         """初始化日志管理器"""
         # 获取配置
+        config_manager = get_config_manager()
         self.log_path = config_manager.get('logging.path')
         self.log_level = self._parse_log_level(config_manager.get('logging.level'))
         self.max_size = self._parse_size(config_manager.get('logging.max_size'))
@@ -32,6 +35,10 @@ class LogManager:
         # 确保日志目录存在
         os.makedirs(self.log_path, exist_ok=True)
         
+        # 后台写日志的监听器，退出时停止以写完队列中剩余的记录
+        self._listener: Optional[logging.handlers.QueueListener] = None
+        atexit.register(self.stop)
+        
         # 初始化根日志器
         self._setup_logging()
     
@@ -88,7 +95,14 @@ class LogManager:
         return 10 * 1024 * 1024
     
     def _setup_logging(self):
-        """设置日志配置"""
+        """设置日志配置
+        
+        根日志器只挂载 QueueHandler，控制台和文件输出（包括文件轮转）
+        由 QueueListener 在后台线程完成，记录日志的线程不再等待磁盘 I/O。
+        """
+        # 停止之前的后台线程
+        self.stop()
+        
         # 获取根日志器
         root_logger = logging.getLogger()
         root_logger.setLevel(self.log_level)
@@ -100,12 +114,11 @@ class LogManager:
         # 创建格式化器
         formatter = logging.Formatter(self.log_format)
         
-        # 添加控制台处理器
+        # 创建控制台处理器
         console_handler = logging.StreamHandler()
         console_handler.setFormatter(formatter)
-        root_logger.addHandler(console_handler)
         
-        # 添加文件处理器
+        # 创建文件处理器
         log_file = os.path.join(self.log_path, 'app.log')
         file_handler = logging.handlers.RotatingFileHandler(
             log_file,
@@ -114,7 +127,27 @@ class LogManager:
             encoding='utf-8'
         )
         file_handler.setFormatter(formatter)
-        root_logger.addHandler(file_handler)
+        
+        # 通过队列转发到后台线程写入
+        log_queue = queue.SimpleQueue()
+        root_logger.addHandler(logging.handlers.QueueHandler(log_queue))
+        self._listener = logging.handlers.QueueListener(
+            log_queue,
+            console_handler,
+            file_handler,
+            respect_handler_level=True
+        )
+        self._listener.start()
+    
+    def stop(self):
+        """停止后台日志线程，写完队列中剩余的记录并关闭处理器"""
+        listener = self._listener
+        if listener is None:
+            return
+        self._listener = None
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
     
     def get_logger(self, name: Optional[str] = None) -> logging.Logger:
         """获取日志器
@@ -140,6 +173,7 @@ class LogManager:
         """重新加载日志配置"""
         try:
             # 重新获取配置
+            config_manager = get_config_manager()
             self.log_level = self._parse_log_level(config_manager.get('logging.level'))
             self.max_size = self._parse_size(config_manager.get('logging.max_size'))
             self.backup_count = config_manager.get('logging.backup_count')
@@ -8,92 +8,130 @@
 """
 
 import os
-import json
 import logging
-from typing import Dict, List
+from typing import Dict, Iterator
 from datetime import datetime
-from pathlib import Path
-from jinja2 import Environment, FileSystemLoader
+from threading import Lock
+from jinja2 import Environment, FileSystemLoader, Template
+from markupsafe import Markup, escape
 
-from .config_manager import config_manager
-from .db_manager import DatabaseManager
+from .config_manager import get_config_manager
+from .db_manager import get_db_manager
 
 logger = logging.getLogger(__name__)
 
+# 目录树 HTML 片段
+_OPEN_DIR = '<div class="directory"><div class="directory-name">📁 {}</div><div class="directory-content">'
+_CLOSE_DIR = '</div></div>'
+_FILE = '<div class="file">📄 {} <span class="file-info">{} | {}</span></div>'
+
+# 按模板目录缓存的 Jinja2 环境，多个生成器实例共享已编译的模板
+_environments: Dict[str, Environment] = {}
+_environments_lock = Lock()
+
+
+def _get_environment(template_dir: str) -> Environment:
+    """获取模板目录对应的 Jinja2 环境
+    
+    模板随程序发布，运行期间不会变化，关闭 auto_reload 后
+    取模板时不再检查文件修改时间。
+    
+    Args:
+        template_dir: 模板目录
+        
+    Returns:
+        Environment: Jinja2 环境
+    """
+    with _environments_lock:
+        env = _environments.get(template_dir)
+        if env is None:
+            env = Environment(
+                loader=FileSystemLoader(template_dir),
+                autoescape=True,
+                auto_reload=False
+            )
+            _environments[template_dir] = env
+        return env
+
 class SnapshotGenerator:
     """快照生成器"""
     
+    # 目录树 HTML 每次输出的文件数量
+    TREE_CHUNK_SIZE = 1000
+    
     def __init__(self):
         """初始化快照生成器"""
         # 获取配置
+        config_manager = get_config_manager()
         self.template_dir = config_manager.get('snapshot.template_dir')
         self.output_dir = config_manager.get('snapshot.output_dir')
         self.max_snapshots = config_manager.get('snapshot.max_snapshots')
         
         # 初始化数据库管理器
-        self.db = DatabaseManager()
+        self.db = get_db_manager()
         
-        # 初始化 Jinja2 环境
-        self.jinja_env = Environment(
-            loader=FileSystemLoader(self.template_dir),
-            autoescape=True
-        )
+        # 初始化 Jinja2 环境，模板在首次生成快照时编译并缓存
+        self.jinja_env = _get_environment(self.template_dir)
+        self._template: Template = None
         
         # 确保输出目录存在
         os.makedirs(self.output_dir, exist_ok=True)
     
-    def _build_directory_tree(self) -> Dict:
-        """构建目录树
+    def _iter_tree_html(self, stats: Dict) -> Iterator[Markup]:
+        """按路径顺序流式生成目录树 HTML
         
-        Returns:
-            Dict: 目录树字典
-        """
-        try:
-            # 获取所有文件记录
-            files = self.db.list_files()
-            
-            # 构建目录树
-            root = {'name': '', 'type': 'dir', 'children': {}}
-            
-            for file in files:
-                path = file['path']
-                is_directory = file['is_directory']
-                size = file['size']
-                modified_time = file['modified_time']
-                
-                # 分割路径
-                parts = Path(path).parts
-                
-                # 从根开始遍历
-                current = root
-                for i, part in enumerate(parts):
-                    # 如果是最后一个部分
-                    if i == len(parts) - 1:
-                        # 添加文件或目录
-                        current['children'][part] = {
-                            'name': part,
-                            'type': 'dir' if is_directory else 'file',
-                            'size': size,
-                            'modified_time': modified_time,
-                            'children': {} if is_directory else None
-                        }
-                    else:
-                        # 如果目录不存在，创建它
-                        if part not in current['children']:
-                            current['children'][part] = {
-                                'name': part,
-                                'type': 'dir',
-                                'size': 0,
-                                'modified_time': 0,
-                                'children': {}
-                            }
-                        current = current['children'][part]
-            
-            return root
+        文件记录按路径排序，同一目录下的文件总是连续出现，只需维护当前
+        打开的目录栈即可输出嵌套结构，内存占用与目录深度相关而与文件数量无关。
+        目录由其包含的文件推导，不含文件的空目录不会出现在快照中。
+        
+        Args:
+            stats: 统计信息，遍历结束时写入 total_dirs/total_files/total_size
             
-        except Exception as e:
-            logger.error(f"构建目录树失败: {e}")
-            raise
+        Yields:
+            Markup: 目录树 HTML 片段
+        """
+        sep = os.sep
+        open_dirs = []
+        chunks = []
+        
+        # 统计值在遍历中用局部变量累加，结束时一次写入
+        total_dirs = total_files = total_size = 0
+        
+        for file in self.db.iter_files(is_directory=False):
+            parts = file['path'].strip(sep).split(sep)
+            dir_parts = parts[:-1]
+            
+            # 关闭不再是当前文件祖先的目录
+            common = 0
+            limit = min(len(open_dirs), len(dir_parts))
+            while common < limit and open_dirs[common] == dir_parts[common]:
+                common += 1
+            if len(open_dirs) > common:
+                chunks.append(_CLOSE_DIR * (len(open_dirs) - common))
+                del open_dirs[common:]
+            
+            # 打开新进入的目录
+            for name in dir_parts[common:]:
+                chunks.append(_OPEN_DIR.format(escape(name)))
+                open_dirs.append(name)
+            total_dirs += len(dir_parts) - common
+            
+            size = file['size']
+            chunks.append(_FILE.format(
+                escape(parts[-1]),
+                self._format_size(size),
+                datetime.fromtimestamp(file['modified_time']).strftime('%Y-%m-%d %H:%M')
+            ))
+            total_files += 1
+            total_size += size
+            
+            if len(chunks) >= self.TREE_CHUNK_SIZE:
+                yield Markup(''.join(chunks))
+                chunks = []
+        
+        chunks.append(_CLOSE_DIR * len(open_dirs))
+        stats.update(total_dirs=total_dirs, total_files=total_files, total_size=total_size)
+        yield Markup(''.join(chunks))
     
     def _format_size(self, size: int) -> str:
         """格式化文件大小
@@ -120,47 +158,26 @@ class SnapshotGenerator:
             bool: 是否生成成功
         """
         try:
-            # 构建目录树
-            tree = self._build_directory_tree()
-            
-            # 计算统计信息
-            total_dirs = 0
-            total_files = 0
-            total_size = 0
-            
-            def count_items(node):
-                nonlocal total_dirs, total_files, total_size
-                for child in node['children'].values():
-                    if child['type'] == 'dir':
-                        total_dirs += 1
-                        count_items(child)
-                    else:
-                        total_files += 1
-                        total_size += child['size']
-            
-            count_items(tree)
+            # 统计信息在生成目录树的同一次遍历中得出，模板在目录树之后读取
+            stats = {'total_dirs': 0, 'total_files': 0, 'total_size': 0}
             
             # 准备模板数据
             data = {
                 'title': title or f"目录快照 - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
                 'generated_time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                'total_dirs': total_dirs,
-                'total_files': total_files,
-                'total_size': self._format_size(total_size),
-                'tree': json.dumps(tree)
+                'tree': self._iter_tree_html(stats),
+                'stats': stats,
+                'format_size': self._format_size
             }
             
             # 生成快照文件名
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
             output_file = os.path.join(self.output_dir, f"snapshot_{timestamp}.html")
             
-            # 渲染模板
-            template = self.jinja_env.get_template('snap2html.jinja2')
-            html = template.render(**data)
-            
-            # 写入文件
-            with open(output_file, 'w', encoding='utf-8') as f:
-                f.write(html)
+            # 流式渲染模板并写入文件，不在内存中保存完整目录树或 HTML
+            if self._template is None:
+                self._template = self.jinja_env.get_template('snap2html.jinja2')
+            self._template.stream(**data).dump(output_file, encoding='utf-8')
             
             logger.info(f"生成快照文件: {output_file}")
             
@@ -9,24 +9,45 @@
 
 import os
 import logging
-from pathlib import Path
-from threading import Lock
-from typing import Set
+from collections import deque
+from threading import get_ident
+from typing import List, Set
 
-from .config_manager import config_manager
+from .config_manager import get_config_manager
 from .emby_notifier import EmbyNotifier
 
 logger = logging.getLogger(__name__)
 
+# BDMV 目录的路径片段，目录内的视频是蓝光原盘的组成部分，不单独创建软链接
+_BDMV_SEGMENT = f"{os.sep}BDMV{os.sep}"
+
+def in_bdmv_dir(path: str) -> bool:
+    """检查文件是否位于 BDMV 目录中
+    
+    视频文件名本身不会是 BDMV，只需检查目录部分。软链接管理器与初始化器共用此判断。
+    
+    Args:
+        path: 文件路径
+        
+    Returns:
+        bool: 是否位于 BDMV 目录中
+    """
+    return _BDMV_SEGMENT in path
+
 class SymlinkManager:
     """软链接管理器"""
     
     def __init__(self):
         """初始化软链接管理器"""
         # 获取配置
+        config_manager = get_config_manager()
         self.target_base = config_manager.get('symlink.target_base')
         self.overwrite_existing = config_manager.get('symlink.overwrite_existing')
-        self.video_extensions = set(config_manager.get('symlink.video_extensions'))
+        self.video_extensions = frozenset(config_manager.get('symlink.video_extensions'))
+        
+        # 挂载点在初始化时绑定，配置变化时重新绑定
+        self._bind_mount_point(config_manager.get('local_monitor.mount_point'))
+        config_manager.subscribe('local_monitor.mount_point', self._bind_mount_point)
         
         # 确保目标目录存在
         os.makedirs(self.target_base, exist_ok=True)
@@ -34,9 +55,26 @@ class SymlinkManager:
         # 初始化 Emby 通知器
         self.emby = EmbyNotifier()
         
-        # 初始化刷新目录集合和锁
-        self.refresh_paths = set()
-        self.refresh_lock = Lock()
+        # 待刷新路径队列，deque 的 append/popleft 是线程安全的，无需加锁
+        self.refresh_paths = deque()
+        
+        # 已创建的目标目录，避免重复调用 makedirs；并发时重复创建无害，无需加锁
+        self._dirs_created: Set[str] = set()
+    
+    def close(self):
+        """发送剩余的 Emby 刷新通知并关闭 Emby 通知器"""
+        self.notify_emby()
+        self.emby.close()
+    
+    def _bind_mount_point(self, mount_point: str):
+        """绑定挂载点
+        
+        Args:
+            mount_point: 挂载点路径
+        """
+        self.mount_point = mount_point
+        # 挂载点下的文件直接截取前缀得到相对路径，不必每次调用 relpath
+        self._mount_prefix = os.path.join(mount_point, '')
     
     def _is_video_file(self, path: str) -> bool:
         """检查是否是视频文件
@@ -47,7 +85,9 @@ class SymlinkManager:
         Returns:
             bool: 是否是视频文件
         """
-        return Path(path).suffix.lower() in self.video_extensions
+        # 直接截取扩展名，避免为每个文件构造 Path 对象
+        i = path.rfind('.')
+        return i != -1 and path[i:].lower() in self.video_extensions
     
     def _should_process(self, path: str) -> bool:
         """检查是否应该处理该文件
@@ -63,7 +103,7 @@ class SymlinkManager:
             return False
         
         # 检查是否在 BDMV 目录中
-        if "BDMV" in Path(path).parts:
+        if in_bdmv_dir(path):
             return False
         
         return True
@@ -101,27 +141,44 @@ class SymlinkManager:
         """
         try:
             # 构建目标路径，保持原始目录结构
-            rel_path = os.path.relpath(source_path, config_manager.get('local_monitor.mount_point'))
+            if source_path.startswith(self._mount_prefix):
+                rel_path = source_path[len(self._mount_prefix):]
+            else:
+                rel_path = os.path.relpath(source_path, self.mount_point)
             target_path = os.path.join(self.target_base, rel_path)
             target_dir = os.path.dirname(target_path)
             
             # 确保目标目录存在
-            os.makedirs(target_dir, exist_ok=True)
+            if target_dir not in self._dirs_created:
+                os.makedirs(target_dir, exist_ok=True)
+                self._dirs_created.add(target_dir)
             
-            # 如果目标已存在且不允许覆盖，则跳过
-            if os.path.exists(target_path):
+            # 直接创建软链接，已存在时再处理，避免先检查再创建的竞争
+            try:
+                os.symlink(source_path, target_path)
+            except FileNotFoundError:
+                # 缓存的目录已被外部删除，重新创建后重试
+                os.makedirs(target_dir, exist_ok=True)
+                os.symlink(source_path, target_path)
+            except FileExistsError:
+                # 如果目标已存在且不允许覆盖，则跳过
                 if not self.overwrite_existing:
                     logger.info(f"目标已存在且不允许覆盖: {target_path}")
                     return False
-                os.remove(target_path)
+                
+                # 在同一目录下创建临时链接后原子替换，不存在删除与创建之间的空窗
+                tmp_path = f"{target_path}.{os.getpid()}.{get_ident()}.tmp"
+                os.symlink(source_path, tmp_path)
+                try:
+                    os.replace(tmp_path, target_path)
+                except OSError:
+                    os.remove(tmp_path)
+                    raise
             
-            # 创建软链接
-            os.symlink(source_path, target_path)
             logger.info(f"创建软链接: {source_path} -> {target_path}")
             
-            # 添加到刷新路径集合
-            with self.refresh_lock:
-                self.refresh_paths.add(target_path)
+            # 添加到刷新路径队列
+            self.refresh_paths.append(target_path)
             
             return True
             
@@ -131,23 +188,52 @@ class SymlinkManager:
     
     def notify_emby(self):
         """通知 Emby 刷新媒体库"""
-        with self.refresh_lock:
-            if not self.refresh_paths:
-                return
-            
+        # 取出当前待刷新的路径，刷新请求期间不阻塞新路径加入
+        paths_to_refresh = set()
+        while True:
             try:
-                # 获取需要刷新的路径
-                paths_to_refresh = self.refresh_paths.copy()
-                self.refresh_paths.clear()
-                
-                # 批量刷新
-                results = self.emby.refresh_multiple(paths_to_refresh)
-                
-                # 记录刷新结果
-                success_count = sum(1 for result in results.values() if result)
-                logger.info(f"Emby 刷新完成: 成功 {success_count}/{len(paths_to_refresh)}")
-                
-            except Exception as e:
-                logger.error(f"通知 Emby 刷新失败: {e}")
-                # 如果刷新失败，将路径重新添加到集合中
-                self.refresh_paths.update(paths_to_refresh)
\ No newline at end of file
+                paths_to_refresh.add(self.refresh_paths.popleft())
+            except IndexError:
+                break
+        
+        if not paths_to_refresh:
+            return
+        
+        try:
+            # 同一目录下的文件只需刷新一次所在目录
+            parents = self._collapse_parents(paths_to_refresh)
+            
+            # 批量刷新
+            results = self.emby.refresh_multiple(parents)
+            
+            # 记录刷新结果
+            success_count = sum(1 for result in results.values() if result)
+            logger.info(f"Emby 刷新完成: 成功 {success_count}/{len(parents)} 个目录，"
+                        f"共 {len(paths_to_refresh)} 个文件")
+            
+        except Exception as e:
+            logger.error(f"通知 Emby 刷新失败: {e}")
+            # 如果刷新失败，将路径重新加入队列
+            self.refresh_paths.extend(paths_to_refresh)
+    
+    @staticmethod
+    def _collapse_parents(paths: Set[str]) -> List[str]:
+        """将文件路径合并为需要刷新的目录
+        
+        取每个文件的父目录，已有祖先目录在列表中的子目录不再单独刷新。
+        
+        Args:
+            paths: 文件路径集合
+            
+        Returns:
+            List[str]: 需要刷新的目录列表
+        """
+        collapsed = []
+        last_prefix = None
+        # 按带结尾分隔符的路径排序，祖先目录之后紧跟其全部子目录
+        for prefix in sorted({os.path.join(os.path.dirname(p), '') for p in paths}):
+            if last_prefix and prefix.startswith(last_prefix):
+                continue
+            last_prefix = prefix
+            collapsed.append(os.path.dirname(prefix))
+        return collapsed
\ No newline at end of file
@@ -10,22 +10,53 @@
 
 import os
 import time
+import heapq
+import inspect
 import logging
-from typing import Any, Callable, Dict, List, Optional
-from queue import PriorityQueue
-from threading import Thread, Event, Lock
-from concurrent.futures import ThreadPoolExecutor
-from datetime import datetime, timedelta
+from functools import lru_cache
+from itertools import count
+from collections import deque, namedtuple
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from threading import Thread, Event, Lock, Condition
+from concurrent.futures import ProcessPoolExecutor
+from queue import Full
+from datetime import datetime
 
-from .config_manager import config_manager
+from .config_manager import get_config_manager
 
 logger = logging.getLogger(__name__)
 
+@lru_cache(maxsize=256)
+def _accepts_cancel_event(func: Callable) -> bool:
+    """判断任务函数是否接受 cancel_event 参数
+    
+    Args:
+        func: 任务函数（绑定方法需传入其底层函数）
+        
+    Returns:
+        bool: 是否接受 cancel_event 参数
+    """
+    try:
+        return 'cancel_event' in inspect.signature(func).parameters
+    except (TypeError, ValueError):
+        return False
+
+# 任务状态快照，每次状态变更都发布新的不可变快照，读取方无需加锁
+TaskSnapshot = namedtuple('TaskSnapshot', [
+    'status', 'created_ns', 'start_ns', 'end_ns', 'retry_count', 'result', 'error'
+])
+
 class Task:
     """任务类"""
     
+    # 每次提交都会创建任务对象，使用 __slots__ 省去实例字典
+    __slots__ = ('task_id', 'func', 'args', 'kwargs', 'priority', 'cpu_bound', 'snapshot')
+    
+    # 已回收任务对象的空闲列表，提交任务时优先复用
+    _pool: deque = deque(maxlen=1024)
+    
     def __init__(self, func: Callable, args: tuple = None, kwargs: dict = None,
-                 priority: int = 0, retry_count: int = 0):
+                 priority: int = 0, retry_count: int = 0, cpu_bound: bool = False):
         """初始化任务
         
         Args:
@@ -34,18 +65,64 @@ class Task:
             kwargs: 关键字参数
             priority: 优先级（数字越小优先级越高）
             retry_count: 当前重试次数
+            cpu_bound: 是否为计算密集型任务
         """
+        self.task_id = None
         self.func = func
         self.args = args or ()
         self.kwargs = kwargs or {}
         self.priority = priority
-        self.retry_count = retry_count
-        self.created_time = datetime.now()
-        self.start_time = None
-        self.end_time = None
-        self.status = 'pending'  # pending, running, completed, failed
-        self.result = None
-        self.error = None
+        self.cpu_bound = cpu_bound
+        # 状态: pending, running, completed, failed, cancelled
+        # 时间戳为单调时钟纳秒值，仅在查询状态时转换为 datetime
+        self.snapshot = TaskSnapshot(
+            status='pending',
+            created_ns=time.monotonic_ns(),
+            start_ns=None,
+            end_ns=None,
+            retry_count=retry_count,
+            result=None,
+            error=None
+        )
+    
+    @classmethod
+    def acquire(cls, func: Callable, args: tuple = None, kwargs: dict = None,
+                priority: int = 0, cpu_bound: bool = False) -> 'Task':
+        """获取任务对象，优先从空闲列表中复用
+        
+        Args:
+            func: 任务函数
+            args: 位置参数
+            kwargs: 关键字参数
+            priority: 优先级（数字越小优先级越高）
+            cpu_bound: 是否为计算密集型任务
+            
+        Returns:
+            Task: 任务对象
+        """
+        try:
+            task = cls._pool.pop()
+        except IndexError:
+            return cls(func, args, kwargs, priority, cpu_bound=cpu_bound)
+        
+        task.__init__(func, args, kwargs, priority, cpu_bound=cpu_bound)
+        return task
+    
+    def release(self):
+        """释放任务引用的对象并放回空闲列表"""
+        self.func = None
+        self.args = ()
+        self.kwargs = {}
+        self.snapshot = None
+        Task._pool.append(self)
+    
+    def publish(self, **changes):
+        """发布新的状态快照
+        
+        Args:
+            **changes: 需要更新的快照字段
+        """
+        self.snapshot = self.snapshot._replace(**changes)
     
     def __lt__(self, other):
         """优先级比较"""
@@ -57,49 +134,102 @@ class TaskQueue:
     def __init__(self):
         """初始化任务队列管理器"""
         # 获取配置
-        self.max_workers = config_manager.get('task_queue.max_workers')
+        config_manager = get_config_manager()
+        self.max_workers = config_manager.get('task_queue.max_workers', 4)
         self.max_retries = config_manager.get('task_queue.max_retries')
         self.retry_delay = config_manager.get('task_queue.retry_delay')
         self.batch_size = config_manager.get('task_queue.batch_size')
+        self.max_pending = config_manager.get('task_queue.max_pending', 10000)
         
-        # 初始化队列和线程池
-        self.queue = PriorityQueue()
-        self.executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        # 墙上时钟与单调时钟的差值，启动时记录一次，用于将任务时间戳转换为 datetime
+        self._wall_offset_ns = time.time_ns() - time.monotonic_ns()
         
-        # 初始化状态追踪
-        self.tasks: Dict[str, Task] = {}
+        # 初始化优先级堆，堆元素为 (优先级, 序号, 任务)，
+        # 序号保证同优先级的任务按提交顺序执行
+        self._heap: List[Tuple[int, int, Task]] = []
+        self._seq = count()
+        
+        # 等待重试的任务堆，元素为 (可执行时间, 序号, 任务)，到期后移入优先级堆
+        self._delayed: List[Tuple[int, int, Task]] = []
+        
+        # 初始化状态追踪，任务记录和优先级堆共用一把锁
+        # 任务ID单调递增，避免任务对象复用或内存地址复用导致ID冲突
+        self.tasks: Dict[int, Task] = {}
+        self._next_id = count(1)
+        
+        # 已结束任务按结束时间排序的索引，元素为 (结束时间, 任务ID)，用于清理过期任务
+        self._finished: List[Tuple[int, int]] = []
         self.task_lock = Lock()
+        self._cv = Condition(self.task_lock)
+        # 队列已满时提交方在此等待，工作线程取出任务后唤醒
+        self._not_full = Condition(self.task_lock)
+        
+        # 计算密集型任务使用的进程池，首次提交此类任务时创建
+        self._cpu_executor: Optional[ProcessPoolExecutor] = None
+        self._cpu_executor_lock = Lock()
         
         # 初始化停止事件
         self.stop_event = Event()
         
-        # 启动处理线程
-        self.processing_thread = Thread(target=self._process_queue)
-        self.processing_thread.start()
+        # 停止时通知正在执行的任务尽快退出，接受 cancel_event 参数的任务函数会收到该事件
+        self.cancel_event = Event()
+        
+        # 启动工作线程，每个线程直接从优先级堆中取任务执行
+        self.workers = [
+            Thread(target=self._worker_loop, name=f'task-worker-{i}', daemon=True)
+            for i in range(self.max_workers)
+        ]
+        for worker in self.workers:
+            worker.start()
     
-    def add_task(self, func: Callable, *args, priority: int = 0, **kwargs) -> str:
+    def add_task(self, func: Callable, *args, priority: int = 0,
+                 cpu_bound: bool = False, block: bool = True, **kwargs) -> int:
         """添加任务
         
+        计算密集型任务在进程池中执行以绕开 GIL，此类任务的函数和参数必须可被 pickle
+        （如模块级函数）；其他任务直接在工作线程中执行。
+        
         Args:
             func: 任务函数
             *args: 位置参数
             priority: 优先级
+            cpu_bound: 是否为计算密集型任务
+            block: 队列已满时是否等待，为 False 时抛出 queue.Full
             **kwargs: 关键字参数
             
         Returns:
-            str: 任务ID
+            int: 任务ID
+            
+        Raises:
+            queue.Full: 队列已满且 block 为 False
+            RuntimeError: 任务队列已停止
         """
         try:
-            # 创建任务
-            task = Task(func, args, kwargs, priority)
-            task_id = str(id(task))
+            # 支持协作取消的任务函数注入取消事件
+            if (not cpu_bound and 'cancel_event' not in kwargs and
+                    _accepts_cancel_event(getattr(func, '__func__', func))):
+                kwargs['cancel_event'] = self.cancel_event
             
-            # 记录任务
-            with self.task_lock:
+            # 记录任务并添加到队列
+            with self._cv:
+                # 队列已满时等待或拒绝，限制排队任务占用的内存；
+                # 等待重试的任务同样占用队列，一并计入
+                if self.queue_depth >= self.max_pending and not self.stop_event.is_set():
+                    if not block:
+                        raise Full(f"任务队列已满: {self.max_pending}")
+                    self._not_full.wait_for(
+                        lambda: self.queue_depth < self.max_pending or self.stop_event.is_set())
+                
+                # 停止后不再有工作线程取任务，拒绝入队
+                if self.stop_event.is_set():
+                    raise RuntimeError("任务队列已停止")
+                
+                task = Task.acquire(func, args, kwargs, priority, cpu_bound=cpu_bound)
+                task_id = next(self._next_id)
+                task.task_id = task_id
                 self.tasks[task_id] = task
-            
-            # 添加到队列
-            self.queue.put((priority, task))
+                heapq.heappush(self._heap, (priority, next(self._seq), task))
+                self._cv.notify()
             logger.debug(f"添加任务: {task_id}")
             
             return task_id
@@ -108,7 +238,12 @@ class TaskQueue:
             logger.error(f"添加任务失败: {e}")
             raise
     
-    def get_task_status(self, task_id: str) -> Optional[Dict]:
+    @property
+    def queue_depth(self) -> int:
+        """当前排队等待执行的任务数"""
+        return len(self._heap) + len(self._delayed)
+    
+    def get_task_status(self, task_id: int) -> Optional[Dict]:
         """获取任务状态
         
         Args:
@@ -117,22 +252,36 @@ class TaskQueue:
         Returns:
             Optional[Dict]: 任务状态信息
         """
-        with self.task_lock:
-            task = self.tasks.get(task_id)
-            if not task:
-                return None
-            
-            return {
-                'status': task.status,
-                'created_time': task.created_time,
-                'start_time': task.start_time,
-                'end_time': task.end_time,
-                'retry_count': task.retry_count,
-                'result': task.result,
-                'error': str(task.error) if task.error else None
-            }
-    
-    def cancel_task(self, task_id: str) -> bool:
+        # 只读取一次不可变快照，无需持有任务锁
+        task = self.tasks.get(task_id)
+        snapshot = task.snapshot if task else None
+        if snapshot is None:
+            return None
+        
+        return {
+            'status': snapshot.status,
+            'created_time': self._to_datetime(snapshot.created_ns),
+            'start_time': self._to_datetime(snapshot.start_ns),
+            'end_time': self._to_datetime(snapshot.end_ns),
+            'retry_count': snapshot.retry_count,
+            'result': snapshot.result,
+            'error': str(snapshot.error) if snapshot.error else None
+        }
+    
+    def _to_datetime(self, timestamp_ns: Optional[int]) -> Optional[datetime]:
+        """将单调时钟纳秒时间戳转换为 datetime
+        
+        Args:
+            timestamp_ns: 单调时钟纳秒时间戳
+            
+        Returns:
+            Optional[datetime]: 对应的本地时间
+        """
+        if timestamp_ns is None:
+            return None
+        return datetime.fromtimestamp((timestamp_ns + self._wall_offset_ns) / 1e9)
+    
+    def cancel_task(self, task_id: int) -> bool:
         """取消任务
         
         Args:
@@ -143,66 +292,139 @@ class TaskQueue:
         """
         with self.task_lock:
             task = self.tasks.get(task_id)
-            if not task or task.status != 'pending':
+            if not task or task.snapshot.status != 'pending':
                 return False
             
-            task.status = 'cancelled'
+            task.publish(status='cancelled')
             return True
     
-    def _process_queue(self):
-        """处理任务队列"""
+    def _worker_loop(self):
+        """工作线程主循环：取出优先级最高的任务并执行"""
         while not self.stop_event.is_set():
             try:
                 # 获取任务
-                _, task = self.queue.get(timeout=1)
-                
-                # 如果任务已取消，跳过
-                if task.status == 'cancelled':
-                    continue
-                
-                # 更新任务状态
-                task.status = 'running'
-                task.start_time = datetime.now()
-                
-                try:
-                    # 执行任务
-                    future = self.executor.submit(task.func, *task.args, **task.kwargs)
-                    task.result = future.result()
-                    task.status = 'completed'
+                with self._cv:
+                    while not self.stop_event.is_set():
+                        # 将到期的重试任务移入优先级堆
+                        now_ns = time.monotonic_ns()
+                        while self._delayed and self._delayed[0][0] <= now_ns:
+                            _, _, task = heapq.heappop(self._delayed)
+                            heapq.heappush(self._heap, (task.priority, next(self._seq), task))
+                        if self._heap:
+                            break
+                        
+                        # 等待新任务或最近一个重试任务到期
+                        timeout = 1
+                        if self._delayed:
+                            timeout = min(timeout, (self._delayed[0][0] - now_ns) / 1e9)
+                        self._cv.wait(timeout=timeout)
+                    if not self._heap:
+                        continue
+                    _, _, task = heapq.heappop(self._heap)
+                    self._not_full.notify()
                     
-                except Exception as e:
-                    task.error = e
-                    logger.error(f"任务执行失败: {e}")
+                    # 如果任务已取消，跳过
+                    if task.snapshot.status == 'cancelled':
+                        end_ns = time.monotonic_ns()
+                        task.publish(end_ns=end_ns)
+                        heapq.heappush(self._finished, (end_ns, task.task_id))
+                        continue
                     
-                    # 检查是否需要重试
-                    if task.retry_count < self.max_retries:
-                        task.retry_count += 1
-                        task.status = 'pending'
-                        # 延迟重试
-                        time.sleep(self.retry_delay)
-                        self.queue.put((task.priority, task))
-                        logger.info(f"任务重试 ({task.retry_count}/{self.max_retries})")
-                    else:
-                        task.status = 'failed'
+                    # 在锁内标记为运行中，避免与取消操作竞争
+                    task.publish(status='running', start_ns=time.monotonic_ns())
                 
-                finally:
-                    task.end_time = datetime.now()
-                    self.queue.task_done()
+                self._run_task(task)
                 
             except Exception as e:
                 logger.error(f"处理任务队列失败: {e}")
     
-    def stop(self):
-        """停止任务队列"""
+    def _run_task(self, task: Task):
+        """执行任务，失败时重新入队重试
+        
+        Args:
+            task: 任务
+        """
         try:
-            # 设置停止标志
+            # 执行任务，计算密集型任务交给进程池，工作线程等待结果
+            if task.cpu_bound:
+                future = self._get_cpu_executor().submit(task.func, *task.args, **task.kwargs)
+                result = future.result()
+            else:
+                result = task.func(*task.args, **task.kwargs)
+            self._finish(task, status='completed', result=result)
+            
+        except Exception as e:
+            logger.error(f"任务执行失败: {e}")
+            
+            # 检查是否需要重试
+            retry_count = task.snapshot.retry_count
+            if retry_count < self.max_retries and not self.stop_event.is_set():
+                retry_count += 1
+                task.publish(status='pending', retry_count=retry_count, error=e,
+                             end_ns=time.monotonic_ns())
+                # 延迟重试，放入等待堆而不阻塞当前工作线程
+                ready_ns = time.monotonic_ns() + int(self.retry_delay * 1_000_000_000)
+                with self._cv:
+                    heapq.heappush(self._delayed, (ready_ns, next(self._seq), task))
+                    self._cv.notify()
+                logger.info(f"任务重试 ({retry_count}/{self.max_retries})")
+            else:
+                self._finish(task, status='failed', error=e)
+    
+    def _finish(self, task: Task, **changes):
+        """发布任务的最终状态并登记到结束时间索引
+        
+        Args:
+            task: 任务
+            **changes: 需要更新的快照字段
+        """
+        end_ns = time.monotonic_ns()
+        task.publish(end_ns=end_ns, **changes)
+        with self.task_lock:
+            heapq.heappush(self._finished, (end_ns, task.task_id))
+    
+    def _get_cpu_executor(self) -> ProcessPoolExecutor:
+        """获取计算密集型任务使用的进程池
+        
+        Returns:
+            ProcessPoolExecutor: 进程池
+        """
+        with self._cpu_executor_lock:
+            if self._cpu_executor is None:
+                self._cpu_executor = ProcessPoolExecutor(max_workers=os.cpu_count())
+            return self._cpu_executor
+    
+    def stop(self, timeout: float = 5):
+        """停止任务队列
+        
+        排队中的任务不再执行并标记为已取消，正在执行的任务通过 cancel_event 协作退出，
+        最多等待 timeout 秒，超时后不再等待（工作线程为守护线程）。
+        
+        Args:
+            timeout: 等待正在执行的任务结束的最长时间（秒）
+        """
+        try:
+            # 设置停止和取消标志，取消排队中的任务并唤醒工作线程
             self.stop_event.set()
+            self.cancel_event.set()
+            with self._cv:
+                end_ns = time.monotonic_ns()
+                for _, _, task in self._heap + self._delayed:
+                    task.publish(status='cancelled', end_ns=end_ns)
+                    heapq.heappush(self._finished, (end_ns, task.task_id))
+                self._heap.clear()
+                self._delayed.clear()
+                self._cv.notify_all()
+                self._not_full.notify_all()
             
-            # 等待处理线程结束
-            self.processing_thread.join()
+            # 等待工作线程结束
+            deadline = time.monotonic() + timeout
+            for worker in self.workers:
+                worker.join(max(0, deadline - time.monotonic()))
             
-            # 关闭线程池
-            self.executor.shutdown(wait=True)
+            # 关闭进程池，尚未开始的计算任务直接取消
+            if self._cpu_executor is not None:
+                self._cpu_executor.shutdown(wait=False, cancel_futures=True)
             
             logger.info("停止任务队列")
             
@@ -217,20 +439,18 @@ class TaskQueue:
             max_age: 最大保留时间（秒）
         """
         try:
-            current_time = datetime.now()
+            cutoff_ns = time.monotonic_ns() - max_age * 1_000_000_000
+            expired = 0
             with self.task_lock:
-                # 清理已完成或失败的旧任务
-                expired = [
-                    task_id for task_id, task in self.tasks.items()
-                    if task.status in ('completed', 'failed', 'cancelled') and
-                    (current_time - task.end_time).total_seconds() > max_age
-                ]
-                
-                for task_id in expired:
-                    del self.tasks[task_id]
+                # 按结束时间从早到晚清理，只访问已过期的任务
+                while self._finished and self._finished[0][0] < cutoff_ns:
+                    _, task_id = heapq.heappop(self._finished)
+                    # 回收任务对象
+                    self.tasks.pop(task_id).release()
+                    expired += 1
                 
                 if expired:
-                    logger.debug(f"清理 {len(expired)} 个过期任务")
+                    logger.debug(f"清理 {expired} 个过期任务")
                     
         except Exception as e:
             logger.error(f"清理旧任务失败: {e}")
@@ -11,25 +11,95 @@
 import os
 import time
 import json
-import requests
+import httpx
 import streamlit as st
 from typing import Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 
+# orjson 为可选依赖，用于加速 API 响应的 JSON 解析，不可用时回退到标准库 json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # API 配置
 API_BASE_URL = "http://127.0.0.1:8000"
+# 连接超时（秒），扫描等接口耗时较长，读取不设超时
+API_TIMEOUT = httpx.Timeout(5.0, read=None)
+
+@st.cache_resource
+def get_client() -> httpx.Client:
+    """获取复用连接的 HTTP 客户端"""
+    return httpx.Client(
+        base_url=API_BASE_URL,
+        timeout=API_TIMEOUT,
+        limits=httpx.Limits(max_keepalive_connections=16)
+    )
+
+def loads(data: bytes) -> Dict:
+    """解析 JSON 响应内容"""
+    return orjson.loads(data) if orjson else json.loads(data)
+
+def send_request(method: str, endpoint: str, **kwargs) -> Dict:
+    """发送 API 请求，失败时抛出 httpx.HTTPError，响应不是合法 JSON 时抛出 ValueError"""
+    # 与 requests 一致，忽略值为 None 的查询参数
+    if kwargs.get("params"):
+        kwargs["params"] = {k: v for k, v in kwargs["params"].items() if v is not None}
+    response = get_client().request(method, endpoint, **kwargs)
+    response.raise_for_status()
+    return loads(response.content)
 
 def api_request(method: str, endpoint: str, **kwargs) -> Dict:
     """发送 API 请求"""
-    url = f"{API_BASE_URL}{endpoint}"
+    # 修改类请求会改变后端状态，使只读接口的缓存失效
+    if method != "GET":
+        cached_get.clear()
+    try:
+        return send_request(method, endpoint, **kwargs)
+    except (httpx.HTTPError, ValueError) as e:
+        st.error(f"API 请求失败: {str(e)}")
+        return {}
+
+# 自动刷新会频繁重绘页面，短时间内的重复只读请求直接使用缓存结果，
+# 请求失败时抛出异常，不会缓存错误结果
+@st.cache_data(ttl=2, show_spinner=False)
+def cached_get(endpoint: str, params: tuple = ()) -> Dict:
+    """发送 GET 请求（带缓存）"""
+    return send_request("GET", endpoint, params=dict(params))
+
+def api_get(endpoint: str, params: Optional[Dict] = None) -> Dict:
+    """发送带缓存的 GET 请求"""
     try:
-        response = requests.request(method, url, **kwargs)
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
+        return cached_get(endpoint, tuple(sorted((params or {}).items())))
+    except (httpx.HTTPError, ValueError) as e:
         st.error(f"API 请求失败: {str(e)}")
         return {}
 
+def api_get_all(*endpoints: str) -> List[Dict]:
+    """并发发送多个 GET 请求，按参数顺序返回结果"""
+    # 工作线程中不能调用 Streamlit 组件，错误在主线程统一展示
+    with ThreadPoolExecutor(max_workers=len(endpoints)) as executor:
+        futures = [executor.submit(cached_get, endpoint) for endpoint in endpoints]
+    
+    results = []
+    for future in futures:
+        try:
+            results.append(future.result())
+        except (httpx.HTTPError, ValueError) as e:
+            st.error(f"API 请求失败: {str(e)}")
+            results.append({})
+    return results
+
+# Streamlit 每次交互都会重新执行脚本，缓存配置避免每次重绘都请求后端，
+# 配置保存或导入后需调用 get_config.clear() 使缓存失效
+@st.cache_data(ttl=30, show_spinner=False)
+def get_config() -> Dict:
+    """获取当前配置（带缓存）"""
+    response = get_client().get("/config")
+    response.raise_for_status()
+    return loads(response.content)
+
 def render_status():
     """渲染状态页面"""
     st.header("系统状态")
@@ -37,8 +107,13 @@ def render_status():
     # 添加自动刷新选项
     auto_refresh = st.sidebar.checkbox("自动刷新", value=True)
     
-    # 获取系统状态
-    status = api_request("GET", "/status")
+    # 自动刷新时只按间隔重新执行状态面板，不阻塞脚本线程也不重绘整个页面
+    st.fragment(render_status_panel, run_every=5 if auto_refresh else None)()
+
+def render_status_panel():
+    """渲染状态面板"""
+    # 并发获取系统状态、系统信息和最近处理记录
+    status, system_info, recent_files = api_get_all("/status", "/system/info", "/symlink/recent")
     
     # 使用列布局展示核心指标
     col1, col2, col3 = st.columns(3)
@@ -86,7 +161,7 @@ def render_status():
     
     # 数据库状态
     st.subheader("数据库状态")
-    db_status = api_request("GET", "/system/info").get("database_status", {})
+    db_status = system_info.get("database_status", {})
     col1, col2, col3 = st.columns(3)
     with col1:
         st.metric("数据库大小", f"{db_status.get('size', 0)} MB")
@@ -97,7 +172,6 @@ def render_status():
     
     # 最近处理的文件列表
     st.subheader("最近处理文件")
-    recent_files = api_request("GET", "/symlink/recent")
     if recent_files.get("files"):
         df = pd.DataFrame(recent_files["files"])
         st.dataframe(
@@ -112,18 +186,17 @@ def render_status():
         )
     else:
         st.info("暂无处理记录")
-    
-    # 自动刷新
-    if auto_refresh:
-        time.sleep(5)
-        st.rerun()
 
 def render_config():
     """渲染配置页面"""
     st.header("配置管理")
     
     # 获取当前配置
-    config = api_request("GET", "/config")
+    try:
+        config = get_config()
+    except (httpx.HTTPError, ValueError) as e:
+        st.error(f"API 请求失败: {str(e)}")
+        config = {}
     
     # 配置导入/导出
     col1, col2 = st.columns(2)
@@ -133,6 +206,7 @@ def render_config():
             try:
                 content = uploaded_file.read()
                 api_request("POST", "/config/import", files={"file": uploaded_file})
+                get_config.clear()
                 st.success("配置导入成功")
                 time.sleep(1)
                 st.rerun()
@@ -161,7 +235,7 @@ def render_config():
         )
         new_polling_interval = st.number_input(
             "轮询间隔(秒)", 
-            min_value=1,
+            min_value=30,
             max_value=3600,
             value=local_config.get("polling_interval", 300),
             help="检查目录变化的时间间隔，建议值: 300秒"
@@ -182,7 +256,7 @@ def render_config():
         )
         new_api_interval = st.number_input(
             "API 调用间隔(秒)",
-            min_value=1800,
+            min_value=60,
             max_value=86400,
             value=gdrive_config.get("api_call_interval", 3600),
             help="检查 Google Drive 变化的时间间隔，建议值: 3600秒"
@@ -256,14 +330,16 @@ def render_config():
                     updates.append({"path": "emby.api_key", "value": new_api_key})
                 
                 with st.spinner("正在保存配置..."):
-                    for update in updates:
-                        api_request("POST", "/config", json=update)
-                    
                     if updates:
-                        api_request("POST", "/config/reload")
-                        st.success("配置已更新并重新加载")
-                        time.sleep(1)
-                        st.rerun()
+                        # 一次请求提交全部修改，后端统一写入并保存
+                        result = api_request("POST", "/config/batch", json={"updates": updates})
+                        # 验证失败时 api_request 已显示错误，不再重新加载，保留错误提示
+                        if result.get("status") == "success":
+                            api_request("POST", "/config/reload")
+                            get_config.clear()
+                            st.success("配置已更新并重新加载")
+                            time.sleep(1)
+                            st.rerun()
 
 def render_operations():
     """渲染操作页面"""
@@ -312,7 +388,7 @@ def render_operations():
     
     # Emby 刷新
     st.subheader("Emby 刷新")
-    emby_status = api_request("GET", "/emby/status")
+    emby_status = api_get("/emby/status")
     
     if not emby_status.get("connected"):
         st.error("Emby 服务器未连接")
@@ -327,15 +403,16 @@ def render_operations():
         st.warning("未找到可用的媒体库")
         return
         
-    # 媒体库选择和刷新
+    # 媒体库选择和刷新，按名称建立一次索引
+    libraries_by_name = {lib["Name"]: lib for lib in libraries}
     col1, col2 = st.columns([3, 1])
     with col1:
         selected_library = st.selectbox(
             "选择媒体库", 
-            options=[lib["Name"] for lib in libraries],
+            options=list(libraries_by_name),
             format_func=lambda x: x
         )
-        library_info = next((lib for lib in libraries if lib["Name"] == selected_library), None)
+        library_info = libraries_by_name.get(selected_library)
         if library_info:
             st.text(f"路径: {library_info.get('Path', '未知')}")
             st.text(f"项目数: {library_info.get('ItemCount', 0)}")
@@ -343,7 +420,7 @@ def render_operations():
     with col2:
         if st.button("刷新选中的媒体库", use_container_width=True):
             if st.checkbox("确认刷新该媒体库?", value=False):
-                library_id = next(lib["Id"] for lib in libraries if lib["Name"] == selected_library)
+                library_id = libraries_by_name[selected_library]["Id"]
                 with st.spinner("正在刷新媒体库..."):
                     result = api_request("POST", f"/emby/refresh/library/{library_id}")
                     if result.get("status") == "success":
@@ -375,7 +452,7 @@ def render_system():
     st.header("系统信息")
     
     # 获取系统信息
-    info = api_request("GET", "/system/info")
+    info = api_get("/system/info")
     
     # CPU 使用率
     st.subheader("CPU 使用率")
@@ -417,6 +494,47 @@ def render_system():
         if "error" in db_status:
             st.text(f"错误: {db_status['error']}")
 
+# 日志级别对应的背景色
+LEVEL_STYLES = {
+    "ERROR": "background-color: #ffcdd2",
+    "WARNING": "background-color: #fff9c4",
+    "INFO": "background-color: #c8e6c9",
+    "DEBUG": "background-color: #e3f2fd"
+}
+
+def highlight_level(val: str) -> str:
+    """根据日志级别设置不同的背景色"""
+    return LEVEL_STYLES.get(val, "")
+
+# 日志表格列
+LOG_COLUMNS = ["时间", "级别", "模块", "消息"]
+
+# 日志行格式，依次尝试：
+# 1. 默认格式 "时间 [级别] 模块: 消息"
+# 2. 配置文件示例格式 "时间 - 模块 - 级别 - 消息"
+LOG_PATTERNS = [
+    r"^(?P<时间>\S+ \S+) \[(?P<级别>\w+)\] (?P<模块>[^:]+): (?P<消息>.*)$",
+    r"^(?P<时间>\S+ \S+) - (?P<模块>\S+) - (?P<级别>\w+) - (?P<消息>.*)$"
+]
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def parse_logs(logs: tuple) -> pd.DataFrame:
+    """将日志行解析为数据框"""
+    lines = pd.Series(logs, dtype=object).str.rstrip("\r\n")
+    df = pd.DataFrame(index=lines.index, columns=LOG_COLUMNS, dtype=object)
+    
+    # 按格式逐个批量匹配尚未解析的行
+    for pattern in LOG_PATTERNS:
+        missing = df["时间"].isna()
+        if not missing.any():
+            break
+        df.loc[missing, LOG_COLUMNS] = lines[missing].str.extract(pattern)[LOG_COLUMNS].values
+    
+    # 无法解析的行整行作为消息
+    missing = df["时间"].isna()
+    df.loc[missing, "消息"] = lines[missing]
+    return df.fillna("")
+
 def render_logs():
     """渲染日志页面"""
     st.header("系统日志")
@@ -439,13 +557,20 @@ def render_logs():
     # 搜索框
     search_query = st.text_input("搜索日志", placeholder="输入关键字进行搜索...")
     
-    # 获取日志
     params = {
         "lines": lines_per_page,
         "level": selected_level if selected_level != "ALL" else None,
         "search": search_query if search_query else None
     }
-    logs_response = api_request("GET", "/logs", params=params)
+    
+    # 自动刷新时只按间隔重新执行日志面板，不阻塞脚本线程也不重绘整个页面
+    run_every = refresh_interval if auto_refresh else None
+    st.fragment(render_log_panel, run_every=run_every)(params, selected_level, search_query)
+
+def render_log_panel(params: Dict, selected_level: str, search_query: str):
+    """渲染日志面板"""
+    # 获取日志
+    logs_response = api_get("/logs", params)
     
     if not logs_response.get("logs"):
         st.info("没有找到符合条件的日志")
@@ -461,9 +586,16 @@ def render_logs():
                 "level": selected_level if selected_level != "ALL" else None,
                 "search": search_query if search_query else None
             }
-            export_logs = api_request("GET", "/logs", params=export_params)
-            if export_logs.get("logs"):
-                log_content = "\n".join(export_logs["logs"])
+            # 直接下载纯文本日志，不经过 JSON 解析和字符串拼接
+            try:
+                params = {k: v for k, v in export_params.items() if v is not None}
+                response = get_client().get("/logs/export", params=params)
+                response.raise_for_status()
+                log_content = response.content
+            except httpx.HTTPError as e:
+                st.error(f"API 请求失败: {str(e)}")
+                log_content = b""
+            if log_content:
                 st.download_button(
                     label="下载日志文件",
                     data=log_content,
@@ -474,46 +606,11 @@ def render_logs():
     # 日志显示
     st.subheader("日志内容")
     
-    # 使用数据框展示日志
-    logs = logs_response.get("logs", [])
-    log_data = []
-    for log in logs:
-        # 解析日志行
-        try:
-            # 假设日志格式为：时间 [级别] 模块: 消息
-            parts = log.split(" ", 3)
-            if len(parts) >= 4:
-                timestamp, level, module, message = parts
-                level = level.strip("[]")
-                module = module.strip(":")
-            else:
-                timestamp, level, module, message = log, "", "", log
-        except Exception:
-            timestamp, level, module, message = "", "", "", log
-            
-        log_data.append({
-            "时间": timestamp,
-            "级别": level,
-            "模块": module,
-            "消息": message
-        })
-    
-    if log_data:
-        df = pd.DataFrame(log_data)
-        # 根据日志级别设置不同的背景色
-        def highlight_level(val):
-            if val == "ERROR":
-                return "background-color: #ffcdd2"
-            elif val == "WARNING":
-                return "background-color: #fff9c4"
-            elif val == "INFO":
-                return "background-color: #c8e6c9"
-            elif val == "DEBUG":
-                return "background-color: #e3f2fd"
-            return ""
-            
+    # 使用数据框展示日志，日志内容未变化时复用解析结果
+    df = parse_logs(tuple(logs_response.get("logs", [])))
+    if not df.empty:
         st.dataframe(
-            df.style.applymap(highlight_level, subset=["级别"]),
+            df.style.map(highlight_level, subset=["级别"]),
             use_container_width=True,
             height=400
         )
@@ -530,11 +627,6 @@ def render_logs():
                 options=range(1, total_pages + 1),
                 value=current_page
             )
-    
-    # 自动刷新逻辑
-    if auto_refresh:
-        time.sleep(refresh_interval)
-        st.rerun()
 
 def main():
     """主函数"""
@@ -546,19 +638,17 @@ def main():
     
     st.title("软链接管理系统")
     
-    # 侧边栏导航
-    pages = {
-        "系统状态": render_status,
-        "配置管理": render_config,
-        "操作面板": render_operations,
-        "系统信息": render_system,
-        "系统日志": render_logs
-    }
-    
-    page = st.sidebar.radio("导航", list(pages.keys()))
+    # 侧边栏导航，由 Streamlit 负责页面路由，每次只执行选中的页面
+    pages = [
+        st.Page(render_status, title="系统状态", url_path="status", default=True),
+        st.Page(render_config, title="配置管理", url_path="config"),
+        st.Page(render_operations, title="操作面板", url_path="operations"),
+        st.Page(render_system, title="系统信息", url_path="system"),
+        st.Page(render_logs, title="系统日志", url_path="logs")
+    ]
     
     # 渲染选中的页面
-    pages[page]()
+    st.navigation(pages).run()
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -12,11 +12,11 @@
 
 import os
 import sys
-import signal
+import asyncio
 import logging
 from pathlib import Path
-from typing import Dict, Optional
-from fastapi import FastAPI, HTTPException
+from typing import Dict, List, Optional
+from fastapi import FastAPI, HTTPException, Response
 import uvicorn
 from pydantic import BaseModel
 
@@ -25,7 +25,7 @@ from src.core.log_manager import LogManager
 from src.core.local_monitor import LocalMonitor
 from src.core.gdrive_api import GoogleDriveAPI
 from src.core.health_checker import HealthChecker
-from src.core.initializer import Initializer
+from src.core.initializer import Initializer, ScanInProgressError
 from src.core.symlink_manager import SymlinkManager
 from src.core.emby_notifier import EmbyNotifier
 
@@ -38,11 +38,18 @@ gdrive_monitor: Optional[GoogleDriveAPI] = None
 health_checker: Optional[HealthChecker] = None
 symlink_manager: Optional[SymlinkManager] = None
 emby_notifier: Optional[EmbyNotifier] = None
+initializer: Optional[Initializer] = None
+
+# 日志尾部读取的块大小
+LOG_TAIL_BLOCK_SIZE = 16384
 
 class ConfigUpdate(BaseModel):
     path: str
     value: str
 
+class ConfigBatchUpdate(BaseModel):
+    updates: List[ConfigUpdate]
+
 def setup_logging():
     """初始化日志设置"""
     log_manager = LogManager()
@@ -51,7 +58,10 @@ def setup_logging():
 
 def init_services():
     """初始化所有服务"""
-    global monitor, gdrive_monitor, health_checker, symlink_manager, emby_notifier
+    global monitor, gdrive_monitor, health_checker, symlink_manager, emby_notifier, initializer
+    
+    # 创建初始化器，全量扫描请求复用同一实例
+    initializer = Initializer()
     
     # 创建软链接管理器
     symlink_manager = SymlinkManager()
@@ -88,6 +98,10 @@ def cleanup_services():
         gdrive_monitor.stop()
     if health_checker:
         health_checker.stop()
+    if symlink_manager:
+        symlink_manager.close()
+    if emby_notifier:
+        emby_notifier.close()
 
 @app.get("/status")
 async def get_status():
@@ -151,12 +165,20 @@ async def control_gdrive_monitor(action: str):
 @app.post("/scan")
 async def run_full_scan():
     """执行全量扫描"""
+    if not initializer:
+        raise HTTPException(status_code=500, detail="初始化器未初始化")
+    
     try:
-        initializer = Initializer()
-        initializer.initialize()
-        return {"status": "success"}
+        # 扫描耗时较长，放到线程中执行，不阻塞事件循环
+        success = await asyncio.to_thread(initializer.initialize)
+    except ScanInProgressError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"全量扫描失败: {str(e)}")
+    
+    if not success:
+        raise HTTPException(status_code=500, detail="全量扫描失败，详情见日志")
+    return {"status": "success"}
 
 @app.post("/emby/refresh")
 async def refresh_emby(path: Optional[str] = None):
@@ -173,6 +195,44 @@ async def refresh_emby(path: Optional[str] = None):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"刷新 Emby 失败: {str(e)}")
 
+def tail_bytes(file_path: str, lines: int) -> bytes:
+    """从文件末尾按块反向读取最后若干行的原始内容
+    
+    Args:
+        file_path: 文件路径
+        lines: 行数
+        
+    Returns:
+        bytes: 最后 lines 行的内容
+    """
+    if lines <= 0:
+        return b''
+    
+    with open(file_path, 'rb') as f:
+        position = f.seek(0, os.SEEK_END)
+        data = b''
+        # 多读一个换行符，保证第一行是完整的
+        while position > 0 and data.count(b'\n') <= lines:
+            size = min(LOG_TAIL_BLOCK_SIZE, position)
+            position -= size
+            f.seek(position)
+            data = f.read(size) + data
+    
+    return b''.join(data.splitlines(keepends=True)[-lines:])
+
+def tail_lines(file_path: str, lines: int) -> list:
+    """从文件末尾按块反向读取最后若干行
+    
+    Args:
+        file_path: 文件路径
+        lines: 行数
+        
+    Returns:
+        list: 最后 lines 行（保留换行符）
+    """
+    data = tail_bytes(file_path, lines)
+    return data.decode('utf-8', 'replace').splitlines(keepends=True)[-lines:]
+
 @app.get("/logs")
 async def get_logs(lines: int = 50):
     """获取最新日志"""
@@ -183,12 +243,25 @@ async def get_logs(lines: int = 50):
         return {"logs": []}
     
     try:
-        with open(log_file, 'r', encoding='utf-8') as f:
-            logs = f.readlines()[-lines:]
+        logs = tail_lines(log_file, lines)
         return {"logs": logs}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"读取日志失败: {str(e)}")
 
+@app.get("/logs/export")
+async def export_logs(lines: int = 1000):
+    """以纯文本导出最新日志，省去逐行 JSON 编解码"""
+    log_path = config_manager.get('logging.path')
+    log_file = os.path.join(log_path, 'app.log')
+    
+    if not os.path.exists(log_file):
+        return Response(content=b'', media_type="text/plain; charset=utf-8")
+    
+    try:
+        return Response(content=tail_bytes(log_file, lines), media_type="text/plain; charset=utf-8")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"读取日志失败: {str(e)}")
+
 @app.post("/config")
 async def update_config(update: ConfigUpdate):
     """更新配置"""
@@ -198,6 +271,24 @@ async def update_config(update: ConfigUpdate):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"更新配置失败: {str(e)}")
 
+@app.post("/config/batch")
+async def update_config_batch(batch: ConfigBatchUpdate):
+    """批量更新配置并保存到文件"""
+    try:
+        # 值无法转换或验证失败时配置保持不变
+        config_manager.update({
+            update.path: config_manager.convert_value(update.value, update.path)
+            for update in batch.updates
+        })
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=f"配置验证失败: {str(e)}")
+    
+    try:
+        config_manager.save()
+        return {"status": "success"}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"更新配置失败: {str(e)}")
+
 @app.get("/config")
 async def get_config():
     """获取当前配置"""
@@ -315,12 +406,18 @@ async def get_recent_symlinks(limit: int = 50):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取最近记录失败: {str(e)}")
 
-def signal_handler(signum, frame):
-    """处理系统信号"""
-    logger.info(f"接收到信号: {signum}")
-    cleanup_services()
-    logger.info("程序退出")
-    sys.exit(0)
+async def serve():
+    """初始化服务并运行 API 服务，服务退出后清理所有服务"""
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=8000))
+    try:
+        # 初始化服务
+        init_services()
+        
+        # 启动 FastAPI 服务，uvicorn 在事件循环中处理 SIGINT/SIGTERM 并平滑退出
+        await server.serve()
+    finally:
+        cleanup_services()
+        logger.info("程序退出")
 
 if __name__ == '__main__':
     # 设置日志
@@ -328,17 +425,10 @@ if __name__ == '__main__':
     logger.info("启动软链接管理系统")
     
     try:
-        # 初始化服务
-        init_services()
-        
-        # 注册信号处理
-        signal.signal(signal.SIGINT, signal_handler)
-        signal.signal(signal.SIGTERM, signal_handler)
-        
-        # 启动 FastAPI 服务
-        uvicorn.run(app, host="127.0.0.1", port=8000)
-        
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        # uvicorn 平滑退出后会重新抛出收到的 SIGINT
+        pass
     except Exception as e:
         logger.error(f"程序运行出错: {e}")
-        cleanup_services()
         sys.exit(1) 
\ No newline at end of file
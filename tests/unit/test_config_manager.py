@@ -6,6 +6,7 @@ import os
 import yaml
 import pytest
 from pathlib import Path
+from unittest.mock import patch
 
 from src.core.config_manager import ConfigManager
 
@@ -132,4 +133,119 @@ def test_reload_config(test_env):
     
     # 检查配置是否更新
     assert manager.get('monitoring.google_drive.folder_id') == 'modified_folder_id'
-    assert manager.get('monitoring.google_drive.folder_id') != initial_folder_id 
\ No newline at end of file
+    assert manager.get('monitoring.google_drive.folder_id') != initial_folder_id 
+
+
+def test_reload_skips_unchanged_file(test_env):
+    """测试配置文件未变化时重新加载不再解析"""
+    config_path = test_env['config_path']
+    
+    with open(config_path, 'w', encoding='utf-8') as f:
+        yaml.safe_dump({'emby': {'retry_count': 3}}, f)
+    
+    manager = ConfigManager(str(config_path))
+    
+    with patch('src.core.config_manager.yaml.load') as mock_load:
+        manager.reload()
+        mock_load.assert_not_called()
+    
+    assert manager.get('emby.retry_count') == 3
+
+
+def test_attribute_access(test_env):
+    """测试通过 c 属性访问配置"""
+    config_path = test_env['config_path']
+    
+    with open(config_path, 'w', encoding='utf-8') as f:
+        yaml.safe_dump({'emby': {'retry_count': 3}}, f)
+    
+    manager = ConfigManager(str(config_path))
+    assert manager.c.emby.retry_count == 3
+    assert manager.c.emby.not_exist is None
+    
+    manager.set('emby.retry_count', 5)
+    assert manager.c.emby.retry_count == 5
+
+
+def test_subscribe(test_env):
+    """测试订阅配置项变化"""
+    config_path = test_env['config_path']
+    
+    with open(config_path, 'w', encoding='utf-8') as f:
+        yaml.safe_dump({'emby': {'retry_count': 3}}, f)
+    
+    manager = ConfigManager(str(config_path))
+    received = []
+    manager.subscribe('emby.retry_count', received.append)
+    
+    # 值未变化时不通知
+    manager.set('emby.retry_count', 3)
+    assert received == []
+    
+    manager.set('emby.retry_count', 5)
+    assert received == [5]
+    
+    # 重新加载后恢复为文件中的值
+    manager.reload()
+    assert received == [5, 3]
+
+
+def test_update(test_env):
+    """测试批量设置配置项"""
+    config_path = test_env['config_path']
+    
+    with open(config_path, 'w', encoding='utf-8') as f:
+        yaml.safe_dump({'emby': {'retry_count': 3, 'server_url': ''}}, f)
+    
+    manager = ConfigManager(str(config_path))
+    received = []
+    manager.subscribe('emby.retry_count', received.append)
+    
+    manager.update({
+        'emby.retry_count': 5,
+        'emby.server_url': 'http://emby:8096',
+        'new.key': 'new_value'
+    })
+    
+    # 每个变化的配置项只通知一次
+    assert received == [5]
+    assert manager.get('emby.server_url') == 'http://emby:8096'
+    assert manager.get('new.key') == 'new_value'
+    assert manager.c.new.key == 'new_value'
+
+
+def test_update_validation(test_env):
+    """测试批量设置验证失败时不修改配置"""
+    config_path = test_env['config_path']
+    
+    with open(config_path, 'w', encoding='utf-8') as f:
+        yaml.safe_dump({'local_monitor': {'polling_interval': 60}}, f)
+    
+    manager = ConfigManager(str(config_path))
+    with pytest.raises(ValueError):
+        manager.update({
+            'local_monitor.polling_interval': 1,
+            'new.key': 'new_value'
+        })
+    
+    assert manager.get('local_monitor.polling_interval') == 60
+    assert manager.get('new.key') is None
+
+
+def test_save_skips_env_overrides(test_env):
+    """测试保存配置时不写入环境变量覆盖的值"""
+    config_path = test_env['config_path']
+    
+    with open(config_path, 'w', encoding='utf-8') as f:
+        yaml.safe_dump({'emby': {'api_key': '', 'server_url': ''}}, f)
+    
+    with patch.dict(os.environ, {'EMBY_API_KEY': 'secret'}):
+        manager = ConfigManager(str(config_path))
+    assert manager.get('emby.api_key') == 'secret'
+    
+    manager.update({'emby.server_url': 'http://emby:8096'})
+    manager.save()
+    
+    with open(config_path, 'r', encoding='utf-8') as f:
+        config = yaml.safe_load(f)
+    assert config['emby'] == {'api_key': '', 'server_url': 'http://emby:8096'}
\ No newline at end of file
@@ -240,4 +240,85 @@ def test_vacuum(test_env, db_manager):
     size_after = db_path.stat().st_size
     
     # 压缩后的文件应该更小
-    assert size_after < size_before 
\ No newline at end of file
+    assert size_after < size_before 
+
+
+def test_add_files(test_env, db_manager):
+    """测试批量添加文件记录"""
+    file_time = int(time.time())
+    rows = [(f'/bulk/file{i}.mkv', i, file_time, False, '/bulk', None)
+            for i in range(10)]
+    
+    assert db_manager.add_files(rows) == 10
+    assert db_manager.get_file('/bulk/file3.mkv')['size'] == 3
+    
+    # 再次写入时更新已有记录
+    assert db_manager.add_files([('/bulk/file3.mkv', 30, file_time + 1, False, '/bulk', None)]) == 1
+    record = db_manager.get_file('/bulk/file3.mkv')
+    assert record['size'] == 30
+    assert record['modified_time'] == file_time + 1
+    
+    for i in range(10):
+        db_manager.delete_file(f'/bulk/file{i}.mkv')
+
+
+def test_upsert_files(test_env, db_manager):
+    """测试批量更新并返回有变化的文件"""
+    file_time = int(time.time())
+    rows = [(f'/upsert/file{i}.mkv', i, file_time, False, '/upsert', None)
+            for i in range(3)]
+    
+    assert db_manager.upsert_files(rows) == [row[0] for row in rows]
+    
+    # 未变化的记录不返回，修改时间变化的记录返回
+    rows[1] = ('/upsert/file1.mkv', 1, file_time + 1, False, '/upsert', None)
+    assert db_manager.upsert_files(rows) == ['/upsert/file1.mkv']
+    assert db_manager.get_file('/upsert/file1.mkv')['modified_time'] == file_time + 1
+
+    # 修改时间不变但大小变化的记录同样返回
+    rows[2] = ('/upsert/file2.mkv', 20, file_time, False, '/upsert', None)
+    assert db_manager.upsert_files(rows) == ['/upsert/file2.mkv']
+    assert db_manager.get_file('/upsert/file2.mkv')['size'] == 20
+
+    for row in rows:
+        db_manager.delete_file(row[0])
+
+
+def test_compare_files(test_env, db_manager):
+    """测试比较文件变化"""
+    file_time = int(time.time())
+    db_manager.add_files([
+        ('/cmp/keep.mkv', 100, file_time, False, '/cmp', None),
+        ('/cmp/changed.mkv', 100, file_time, False, '/cmp', None),
+        ('/cmp/gone.mkv', 100, file_time, False, '/cmp', None),
+    ])
+    
+    current = [
+        {'path': '/cmp/keep.mkv', 'size': 100, 'modified_time': file_time},
+        {'path': '/cmp/changed.mkv', 'size': 200, 'modified_time': file_time},
+        {'path': '/cmp/new.mkv', 'size': 100, 'modified_time': file_time},
+    ]
+    new_files, modified_files, deleted_paths = db_manager.compare_files(current)
+    
+    assert [f['path'] for f in new_files] == ['/cmp/new.mkv']
+    assert [f['path'] for f in modified_files] == ['/cmp/changed.mkv']
+    assert '/cmp/gone.mkv' in deleted_paths
+    assert '/cmp/keep.mkv' not in deleted_paths
+    
+    for path in ('/cmp/keep.mkv', '/cmp/changed.mkv', '/cmp/gone.mkv'):
+        db_manager.delete_file(path)
+
+
+def test_iter_files(test_env, db_manager, monkeypatch):
+    """测试分批遍历文件记录"""
+    monkeypatch.setattr(DatabaseManager, 'ITER_BATCH_SIZE', 2)
+    file_time = int(time.time())
+    rows = [(f'/iter/file{i}.mkv', i, file_time, False, '/iter', None) for i in range(5)]
+    db_manager.add_files(rows)
+    
+    paths = [row['path'] for row in db_manager.iter_files('/iter', False)]
+    assert paths == [row[0] for row in rows]
+    assert len(db_manager.list_files('/iter')) == 5
+    
+    for row in rows:
+        db_manager.delete_file(row[0])
\ No newline at end of file
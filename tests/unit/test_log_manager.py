@@ -4,6 +4,7 @@
 
 import os
 import logging
+import logging.handlers
 import pytest
 from pathlib import Path
 
@@ -68,11 +69,13 @@ def test_setup_logging(test_env):
     # 检查日志级别
     assert root_logger.level == manager.log_level
     
-    # 检查处理器
-    assert len(root_logger.handlers) == 2  # 控制台处理器和文件处理器
+    # 检查处理器，根日志器只挂载队列处理器
+    assert len(root_logger.handlers) == 1
+    assert isinstance(root_logger.handlers[0], logging.handlers.QueueHandler)
+    assert len(manager._listener.handlers) == 2  # 控制台处理器和文件处理器
     
     # 检查文件处理器
-    file_handler = next(h for h in root_logger.handlers if isinstance(h, logging.FileHandler))
+    file_handler = next(h for h in manager._listener.handlers if isinstance(h, logging.FileHandler))
     assert file_handler.baseFilename == str(Path(log_dir) / 'symlink.log')
 
 
@@ -0,0 +1,170 @@
+"""
+任务队列单元测试
+"""
+
+import os
+import time
+from queue import Full
+from threading import Event
+from unittest.mock import patch, MagicMock
+
+import pytest
+
+from src.core.task_queue import TaskQueue
+
+
+TEST_QUEUE_CONFIG = {
+    'task_queue.max_workers': 1,
+    'task_queue.max_retries': 1,
+    'task_queue.retry_delay': 0,
+    'task_queue.batch_size': 100,
+    'task_queue.max_pending': 10
+}
+
+
+@pytest.fixture
+def task_queue():
+    """创建单线程任务队列实例"""
+    config = MagicMock()
+    config.get.side_effect = lambda path, default=None: TEST_QUEUE_CONFIG.get(path, default)
+    with patch('src.core.task_queue.get_config_manager', return_value=config):
+        queue = TaskQueue()
+    yield queue
+    queue.stop()
+
+
+def wait_for_status(queue, task_id, status, timeout=2):
+    """等待任务进入指定状态"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        info = queue.get_task_status(task_id)
+        if info and info['status'] == status:
+            return info
+        time.sleep(0.01)
+    raise AssertionError(f"任务 {task_id} 未进入状态 {status}")
+
+
+def test_priority_order(task_queue):
+    """测试按优先级执行，同优先级按提交顺序执行"""
+    gate = Event()
+    order = []
+    
+    # 先占住唯一的工作线程，使后续任务在队列中等待
+    task_queue.add_task(gate.wait, priority=0)
+    task_ids = {
+        value: task_queue.add_task(order.append, value, priority=priority)
+        for value, priority in [('c', 3), ('a1', 1), ('b', 2), ('a2', 1)]
+    }
+    gate.set()
+    
+    # 优先级最低的任务最后执行
+    wait_for_status(task_queue, task_ids['c'], 'completed')
+    assert order == ['a1', 'a2', 'b', 'c']
+
+
+def test_retry_then_fail(task_queue):
+    """测试失败任务重试后标记为失败"""
+    func = MagicMock(side_effect=RuntimeError('boom'))
+    task_id = task_queue.add_task(func)
+    
+    info = wait_for_status(task_queue, task_id, 'failed')
+    assert func.call_count == 2
+    assert info['retry_count'] == 1
+    assert info['error'] == 'boom'
+
+def test_retry_delay_does_not_block_queue(task_queue):
+    """测试等待重试期间其他任务照常执行"""
+    task_queue.retry_delay = 0.5
+    func = MagicMock(side_effect=RuntimeError('boom'))
+    failing_id = task_queue.add_task(func)
+    task_id = task_queue.add_task(time.monotonic)
+    
+    # 唯一的工作线程不应被重试延迟阻塞
+    wait_for_status(task_queue, task_id, 'completed', timeout=0.3)
+    assert task_queue.get_task_status(failing_id)['status'] == 'pending'
+    
+    info = wait_for_status(task_queue, failing_id, 'failed')
+    assert func.call_count == 2
+    assert info['retry_count'] == 1
+
+def test_cpu_bound_task(task_queue):
+    """测试计算密集型任务在进程池中执行"""
+    task_id = task_queue.add_task(os.getpid, cpu_bound=True)
+    
+    info = wait_for_status(task_queue, task_id, 'completed', timeout=10)
+    assert info['result'] != os.getpid()
+
+
+def test_max_pending(task_queue):
+    """测试队列已满时拒绝非阻塞提交"""
+    gate = Event()
+    task_queue.max_pending = 1
+    
+    # 占住工作线程后再排入一个任务，队列达到上限
+    task_queue.add_task(gate.wait, priority=0)
+    wait_until = time.monotonic() + 2
+    while task_queue.queue_depth and time.monotonic() < wait_until:
+        time.sleep(0.01)
+    task_queue.add_task(time.monotonic)
+    
+    with pytest.raises(Full):
+        task_queue.add_task(time.monotonic, block=False)
+    
+    gate.set()
+
+
+def test_max_pending_counts_retries(task_queue):
+    """测试等待重试的任务计入队列上限"""
+    task_queue.max_pending = 1
+    task_queue.retry_delay = 60
+    
+    # 失败任务进入重试等待堆后，队列达到上限
+    failed_id = task_queue.add_task(os.stat, '/nonexistent/path')
+    wait_until = time.monotonic() + 2
+    while (task_queue.get_task_status(failed_id)['retry_count'] == 0
+           and time.monotonic() < wait_until):
+        time.sleep(0.01)
+    assert task_queue.queue_depth == 1
+    
+    with pytest.raises(Full):
+        task_queue.add_task(time.monotonic, block=False)
+
+
+def test_cleanup_old_tasks(task_queue):
+    """测试只清理超过保留时间的已结束任务"""
+    gate = Event()
+    done_id = task_queue.add_task(time.monotonic)
+    wait_for_status(task_queue, done_id, 'completed')
+    running_id = task_queue.add_task(gate.wait)
+    wait_for_status(task_queue, running_id, 'running')
+    
+    # 保留时间内不清理
+    task_queue.cleanup_old_tasks(max_age=3600)
+    assert task_queue.get_task_status(done_id) is not None
+    
+    task_queue.cleanup_old_tasks(max_age=0)
+    assert task_queue.get_task_status(done_id) is None
+    assert task_queue.get_task_status(running_id)['status'] == 'running'
+    
+    gate.set()
+
+
+def test_stop_cancels_tasks(task_queue):
+    """测试停止时通知运行中的任务并取消排队中的任务"""
+    started = Event()
+    
+    def wait_cancel(cancel_event):
+        started.set()
+        return cancel_event.wait(2)
+    
+    running_id = task_queue.add_task(wait_cancel)
+    started.wait(1)
+    pending_id = task_queue.add_task(time.monotonic)
+    
+    task_queue.stop()
+    assert task_queue.get_task_status(running_id)['result'] is True
+    assert task_queue.get_task_status(pending_id)['status'] == 'cancelled'
+    
+    # 停止后拒绝新任务
+    with pytest.raises(RuntimeError):
+        task_queue.add_task(time.monotonic)
\ No newline at end of file